@@ -0,0 +1,186 @@
+'''Benchmarks of perilousgenerator: generation, rendering, import time and memory.
+
+Results can be saved as a json baseline and later runs compared against it, the comparison
+exits with status 1 when a gated metric regresses by more than the tolerance. Each benchmark
+runs repeat times and keeps the best value of each metric.'''
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import perilousgenerator
+
+BENCHMARKED_GENERATORS = ('discovery', 'danger', 'dungeon', 'dungeon exploration')
+
+# Metrics whose name ends with one of these suffixes are better when higher.
+HIGHER_IS_BETTER = ('throughput',)
+
+# Tail latencies vary too much between runs to fail a comparison, their regressions are only
+# reported.
+NOT_GATED = ('/p90', '/p99')
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def _timings(function, count):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def _timing_metrics(prefix, timings):
+    timings = sorted(timings)
+    return {prefix + '/throughput': len(timings) / sum(timings),
+            prefix + '/p50': _percentile(timings, 0.5),
+            prefix + '/p90': _percentile(timings, 0.9),
+            prefix + '/p99': _percentile(timings, 0.99)}
+
+def bench_generate(count):
+    metrics = {}
+    for name in BENCHMARKED_GENERATORS:
+        generator = perilousgenerator.generators[name]
+        metrics.update(_timing_metrics('generate/' + name, _timings(generator.generate, count)))
+    return metrics
+
+def bench_render(count):
+    metrics = {}
+    for name in BENCHMARKED_GENERATORS:
+        generator = perilousgenerator.generators[name]
+        results = [generator.generate() for _ in range(count)]
+        results_iterator = iter(results)
+        with contextlib.redirect_stdout(io.StringIO()):
+            timings = _timings(lambda: generator._recursive_print(next(results_iterator)), count)
+            metrics.update(_timing_metrics('render/' + name, timings))
+            metrics.update(_timing_metrics('generate_print/' + name,
+                                           _timings(generator.generate_print, count)))
+    return metrics
+
+def bench_import(repeat):
+    '''Import time in a fresh interpreter, best of repeat runs.'''
+    code = ('import time; start = time.perf_counter(); import perilousgenerator; '
+            'print(time.perf_counter() - start, perilousgenerator.tables_load_time)')
+    directory = os.path.dirname(os.path.abspath(perilousgenerator.__file__))
+    import_times = []
+    load_times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], cwd=directory, check=True,
+                                capture_output=True, text=True).stdout
+        import_time, load_time = map(float, output.split())
+        import_times.append(import_time)
+        load_times.append(load_time)
+    return {'import/time': min(import_times), 'import/tables_load_time': min(load_times)}
+
+def bench_memory(count):
+    '''Peak memory of holding generated results, scaled to 100k results.'''
+    metrics = {}
+    for name in BENCHMARKED_GENERATORS:
+        generator = perilousgenerator.generators[name]
+        tracemalloc.start()
+        results = [generator.generate() for _ in range(count)]
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del results
+        metrics['memory/' + name + '/peak_per_100k'] = peak * 100000 / count
+    return metrics
+
+def _best(runs):
+    '''Best value of each metric over the metrics of several runs.'''
+    return {name: (max if name.endswith(HIGHER_IS_BETTER) else min)(run[name] for run in runs)
+            for name in runs[0]}
+
+def run(count, memory_count, import_repeat, seed, repeat=10):
+    '''Runs the benchmarks repeat times, returns the best value of each metric.'''
+    metrics = {}
+    metrics.update(bench_import(import_repeat))
+    # Repeats are interleaved so that a slow period of the machine does not hit all the runs of
+    # a benchmark, and each generates the same results.
+    runs = []
+    for _ in range(repeat):
+        random.seed(seed)
+        runs.append(bench_generate(count))
+        runs[-1].update(bench_render(count))
+    metrics.update(_best(runs))
+    random.seed(seed)
+    metrics.update(bench_memory(memory_count))
+    return metrics
+
+def _tolerance(name, tolerance, metric_tolerances):
+    '''Tolerance of the longest metric_tolerances prefix of name, tolerance without one.'''
+    prefixes = [prefix for prefix in metric_tolerances if name.startswith(prefix)]
+    return metric_tolerances[max(prefixes, key=len)] if prefixes else tolerance
+
+def compare(metrics, baseline, tolerance, metric_tolerances={}):
+    '''Returns the (name, baseline value, value) of the metrics regressing over tolerance, or
+    over the tolerance of their longest prefix in metric_tolerances, NOT_GATED metrics
+    included.'''
+    regressions = []
+    for name, baseline_value in baseline.items():
+        if name not in metrics or not baseline_value:
+            continue
+        ratio = metrics[name] / baseline_value
+        tolerance_of_name = _tolerance(name, tolerance, metric_tolerances)
+        if name.endswith(HIGHER_IS_BETTER):
+            regressed = ratio < 1 / (1 + tolerance_of_name)
+        else:
+            regressed = ratio > 1 + tolerance_of_name
+        if regressed:
+            regressions.append((name, baseline_value, metrics[name]))
+    return regressions
+
+def _metric_tolerance(text):
+    prefix, _, tolerance = text.rpartition('=')
+    if not prefix:
+        raise argparse.ArgumentTypeError(text + ': expected PREFIX=TOLERANCE')
+    return prefix, float(tolerance)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks perilousgenerator.')
+    parser.add_argument('-n', '--count', type=int, default=1000,
+                        help='results generated and rendered per generator and repeat')
+    parser.add_argument('--memory-count', type=int, default=10000,
+                        help='results held per generator to measure memory')
+    parser.add_argument('--import-repeat', type=int, default=10,
+                        help='fresh interpreters started to measure import time')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='runs of the timings, the best of which is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', metavar='PATH', help='save the results as a json baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare with a json baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative change tolerated before a regression is reported')
+    parser.add_argument('--metric-tolerance', type=_metric_tolerance, action='append',
+                        default=[], metavar='PREFIX=TOLERANCE',
+                        help='tolerance of the metrics starting with PREFIX, can be repeated')
+    args = parser.parse_args(argv)
+    metrics = run(args.count, args.memory_count, args.import_repeat, args.seed, args.repeat)
+    for name, value in metrics.items():
+        print('{:<50} {:>14.6g}'.format(name, value))
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(metrics, file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(metrics, json.load(file), args.tolerance,
+                                  dict(args.metric_tolerance))
+        gated = False
+        for name, baseline_value, value in regressions:
+            if name.endswith(NOT_GATED):
+                print('tail regression (not gated): {} {:.6g} -> {:.6g}'.format(
+                    name, baseline_value, value))
+            else:
+                print('regression: {} {:.6g} -> {:.6g}'.format(name, baseline_value, value))
+                gated = True
+        if gated:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+'''Deduplicating corpus of results of perilousgenerator, stored in a local SQLite file.
+
+Each result is stored once under the hash of its canonical json form, with the number of times
+it was generated. Results are inserted by batches, one transaction per batch, and duplicates
+within a batch are counted before reaching the database.'''
+
+import argparse
+import collections
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+
+import perilousgenerator
+
+# Results hashed and counted per task sent to ingest workers.
+INGEST_CHUNK_SIZE = 4096
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS trees (
+    hash BLOB PRIMARY KEY,
+    generator TEXT NOT NULL,
+    tree TEXT NOT NULL,
+    count INTEGER NOT NULL
+) WITHOUT ROWID
+'''
+
+_UPSERT = '''
+INSERT INTO trees (hash, generator, tree, count) VALUES (?, ?, ?, ?)
+ON CONFLICT (hash) DO UPDATE SET count = count + excluded.count
+'''
+
+def canonical_form(result):
+    '''Returns the canonical json text of a result in nested lists or as a ResultTree.'''
+    if isinstance(result, perilousgenerator.ResultTree):
+        result = result.to_lists()
+    return json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+
+def tree_hash(tree):
+    '''Hash of a canonical json text.'''
+    return hashlib.blake2b(tree.encode('utf-8'), digest_size=16).digest()
+
+def _tree_key(result):
+    if isinstance(result, perilousgenerator.ResultTree):
+        result = result.to_lists()
+    return result[0], canonical_form(result)
+
+def _count_trees(results):
+    '''Returns {(generator name, canonical json text): count} of results.'''
+    return collections.Counter(map(_tree_key, results))
+
+def _generate_counts(chunk):
+    '''Generates and counts results in a worker, result i using GenerationContext(seed, (i,)).'''
+    generator_name, seed, start, stop = chunk
+    generator = perilousgenerator.generators[generator_name]
+    return _count_trees(generator.generate(rng=perilousgenerator.GenerationContext(seed, (i,)))
+                        for i in range(start, stop))
+
+class CorpusStore:
+    '''Corpus of unique results with their occurrence counts in the SQLite file path.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # The write-ahead log appends each transaction once instead of journaling its pages.
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.execute(_SCHEMA)
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_counts(self, counts):
+        '''Adds {(generator name, canonical json text): count} in a single transaction.'''
+        with self.connection:
+            self.connection.executemany(
+                _UPSERT, ((tree_hash(tree), generator_name, tree, count)
+                          for (generator_name, tree), count in counts.items()))
+
+    def add_many(self, results, batch_size=INGEST_CHUNK_SIZE):
+        '''Adds results, one transaction per batch_size results.'''
+        batch = []
+        for result in results:
+            batch.append(result)
+            if len(batch) == batch_size:
+                self.add_counts(_count_trees(batch))
+                batch = []
+        if batch:
+            self.add_counts(_count_trees(batch))
+
+    def add(self, result):
+        self.add_counts(_count_trees((result,)))
+
+    def ingest(self, generator_name, count, seed, jobs=1):
+        '''Generates count results as generate_batch does with seed and adds them.
+
+        Results are hashed and counted by chunks in jobs worker processes, each chunk being
+        added in a single transaction.'''
+        chunks = [(generator_name, seed, start, min(start + INGEST_CHUNK_SIZE, count))
+                  for start in range(0, count, INGEST_CHUNK_SIZE)]
+        if jobs == 1:
+            for counts in map(_generate_counts, chunks):
+                self.add_counts(counts)
+        else:
+            with multiprocessing.Pool(jobs) as pool:
+                for counts in pool.imap_unordered(_generate_counts, chunks):
+                    self.add_counts(counts)
+
+    def results(self, generator_name=None):
+        '''Yields (result, count) of the unique results, of a generator or of all.'''
+        if generator_name is None:
+            rows = self.connection.execute('SELECT tree, count FROM trees')
+        else:
+            rows = self.connection.execute('SELECT tree, count FROM trees WHERE generator = ?',
+                                           (generator_name,))
+        for tree, count in rows:
+            yield json.loads(tree), count
+
+    def count(self, result):
+        '''Number of times a result was added.'''
+        row = self.connection.execute('SELECT count FROM trees WHERE hash = ?',
+                                      (tree_hash(canonical_form(result)),)).fetchone()
+        return row[0] if row else 0
+
+    def stats(self):
+        '''Returns {generator name: (unique results, total results)}.'''
+        return {generator: (unique, total) for generator, unique, total
+                in self.connection.execute('SELECT generator, COUNT(*), SUM(count) FROM trees '
+                                           'GROUP BY generator ORDER BY generator')}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Stores results of perilousgenerator in a deduplicating SQLite corpus.')
+    parser.add_argument('path', help='SQLite file of the corpus')
+    parser.add_argument('generator', nargs='?',
+                        help='name of the generator to ingest results of, prints the corpus '
+                             'statistics without it')
+    parser.add_argument('-n', '--count', type=int, default=1, help='number of results')
+    parser.add_argument('--seed', type=int, help='seed of the results (random by default)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes, 0 for one per core')
+    args = parser.parse_args(argv)
+    if args.generator is not None and args.generator not in perilousgenerator.generators:
+        parser.error(args.generator + ': not found')
+    with CorpusStore(args.path) as store:
+        if args.generator is not None:
+            seed = args.seed
+            if seed is None:
+                seed = perilousgenerator.GenerationContext().seed
+            store.ingest(args.generator, args.count, seed, args.jobs or os.cpu_count())
+        for generator_name, (unique, total) in store.stats().items():
+            sys.stdout.write('{:<32} {:>10} unique {:>12} total\n'.format(
+                generator_name, unique, total))
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,127 @@
+import time
+
+# Start of the import, see import_time.
+_import_start = time.perf_counter()
+
+import array
+import bisect
 import collections
+import importlib
+import io
+import itertools
+import json
+import math
+import marshal
+import os
 import random
+import re
+import struct
+import sys
+import threading
+import warnings
+from fractions import Fraction
+
+# Modules only needed by the command line, the worker pools, the compressed outputs and the
+# other occasional uses are imported by the functions using them, to keep the import fast.
+
+# numpy is optional and slow to import, it is only imported on first use by _import_numpy.
+numpy = None
+
+def _import_numpy():
+    global numpy
+    if numpy is None:
+        import numpy
+    return numpy
+
+def _convolve(distribution, other):
+    '''Distribution of the sum of two independent {result: probability} distributions.'''
+    convolved = collections.defaultdict(Fraction)
+    for result, probability in distribution.items():
+        for other_result, other_probability in other.items():
+            convolved[result + other_result] += probability * other_probability
+    return dict(convolved)
+
+# Largest number of equally likely rolls of dice rolled with a single draw in their roll table,
+# wider dice sum their die rolls rather than convolve a wide distribution first.
+ROLL_TABLE_MAX_TOTAL = 2 ** 12
+
+def _roll_table(distribution):
+    '''Compiles a distribution into (results, cumulative counts, total): a uniform draw in
+    range(total) selects results[bisect_right(cumulative counts, draw)], with the exact
+    probabilities of the distribution.'''
+    total = math.lcm(*(probability.denominator for probability in distribution.values()))
+    results = sorted(distribution)
+    cumulative = tuple(itertools.accumulate(int(distribution[result] * total)
+                                            for result in results))
+    return tuple(results), cumulative, total
+
+def _roll_compiled(dice, rng):
+    results, cumulative, total = dice.roll_table()
+    return results[bisect.bisect_right(cumulative, (rng or random).randint(0, total - 1))]
+
+def _roll_summed(faces, bonus, rng):
+    '''Rolls each die of faces, (value, n) pairs, one at a time and sums them with bonus.'''
+    rng = rng or random
+    return sum(rng.randint(1, value) for value, n in faces for _ in range(n)) + bonus
+
+def _roll_many_compiled(dice, size, rng):
+    results, cumulative, total = dice.roll_table()
+    draws = rng.integers(0, total, size=size)
+    numpy = _import_numpy()
+    return numpy.asarray(results)[numpy.searchsorted(cumulative, draws, side='right')]
 
 class Die:
-    '''Roll n times a die value (d4, d6, ...).'''
+    '''Roll n times a die value (d4, d6, ...).
+
+    Several dice are rolled with a single draw in their compiled sum distribution, up to
+    ROLL_TABLE_MAX_TOTAL equally likely rolls.'''
     def __init__(self, value, n=1):
         self.value = value
         self.n = n
-
-    def roll(self):
-        return sum(random.randint(1, self.value) for _ in range(self.n))
+        self.faces = ((value, n),)
+        self.single_draw = value ** n <= ROLL_TABLE_MAX_TOTAL
+        self._distribution = None
+        self._roll_table = None
+
+    def roll(self, rng=None):
+        '''Roll with rng (a random.Random or GenerationContext), the random module by default.'''
+        if self.n == 1:
+            return (rng or random).randint(1, self.value)
+        if self.single_draw:
+            return _roll_compiled(self, rng)
+        return _roll_summed(self.faces, 0, rng)
+
+    def roll_many(self, size, rng):
+        '''Roll size times at once with a numpy Generator, returns an integer array.'''
+        if self.n == 1:
+            return rng.integers(1, self.value, size=size, endpoint=True)
+        if self.single_draw:
+            return _roll_many_compiled(self, size, rng)
+        return rng.integers(1, self.value, size=(size, self.n), endpoint=True).sum(axis=1)
+
+    def distribution(self):
+        '''Exact probability of each result, as a {result: Fraction} dict.'''
+        if self._distribution is None:
+            face = {result: Fraction(1, self.value) for result in range(1, self.value + 1)}
+            distribution = {0: Fraction(1)}
+            for _ in range(self.n):
+                distribution = _convolve(distribution, face)
+            self._distribution = distribution
+        return self._distribution
+
+    def roll_table(self):
+        '''The distribution compiled by _roll_table.'''
+        if self._roll_table is None:
+            self._roll_table = _roll_table(self.distribution())
+        return self._roll_table
+
+    @property
+    def minimum(self):
+        return self.n
+
+    @property
+    def maximum(self):
+        return self.n * self.value
 
 d2 = Die(2)
 d3 = Die(3)
@@ -21,17 +134,130 @@ d20 = Die(20)
 d100 = Die(100)
 
 class Dice:
-    '''Roll all die in dice_list and adds bonus.'''
+    '''Roll all die in dice_list and adds bonus, with a single draw as Die.'''
 
     def __init__(self, dice_list, bonus=0):
         self.dice_list = dice_list
         self.bonus = bonus
-
-    def roll(self):
-        return sum(die.roll() for die in self.dice_list) + self.bonus
+        self.faces = tuple(face for die in dice_list for face in die.faces)
+        self.single_draw = math.prod(value ** n for value, n in self.faces) <= ROLL_TABLE_MAX_TOTAL
+        self._distribution = None
+        self._roll_table = None
+        # A single die plus a bonus needs no roll table.
+        self._single_die = dice_list[0] if len(dice_list) == 1 and dice_list[0].n == 1 else None
+
+    def roll(self, rng=None):
+        if self._single_die is not None:
+            return (rng or random).randint(1, self._single_die.value) + self.bonus
+        if not self.dice_list:
+            return self.bonus
+        if self.single_draw:
+            return _roll_compiled(self, rng)
+        return _roll_summed(self.faces, self.bonus, rng)
+
+    def roll_many(self, size, rng):
+        if self._single_die is None and self.dice_list and self.single_draw:
+            return _roll_many_compiled(self, size, rng)
+        return sum(die.roll_many(size, rng) for die in self.dice_list) + self.bonus
+
+    def distribution(self):
+        if self._distribution is None:
+            distribution = {self.bonus: Fraction(1)}
+            for die in self.dice_list:
+                distribution = _convolve(distribution, die.distribution())
+            self._distribution = distribution
+        return self._distribution
+
+    def roll_table(self):
+        if self._roll_table is None:
+            self._roll_table = _roll_table(self.distribution())
+        return self._roll_table
+
+    @property
+    def minimum(self):
+        return sum(die.minimum for die in self.dice_list) + self.bonus
+
+    @property
+    def maximum(self):
+        return sum(die.maximum for die in self.dice_list) + self.bonus
+
+class GenerationContext:
+    '''Seedable random state threaded through a generation.
+
+    spawn() derives child contexts whose streams only depend on the root seed and on their
+    position in the spawn tree, so parallel workers get reproducible, independent streams.'''
+
+    def __init__(self, seed=None, spawn_key=()):
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(128)
+        self.seed = seed
+        self.spawn_key = tuple(spawn_key)
+        self.random = random.Random(self._derive_seed(seed, self.spawn_key))
+        self._n_children_spawned = 0
+
+    @staticmethod
+    def _derive_seed(seed, spawn_key):
+        import hashlib
+        digest = hashlib.sha256(repr((seed, spawn_key)).encode()).digest()
+        return int.from_bytes(digest, 'big')
+
+    def spawn(self, n):
+        '''Returns n new independent child contexts.'''
+        start = self._n_children_spawned
+        self._n_children_spawned += n
+        return [GenerationContext(self.seed, self.spawn_key + (i,))
+                for i in range(start, start + n)]
+
+    def randint(self, a, b):
+        return self.random.randint(a, b)
+
+class RollRecorder:
+    '''Random state recording the rolls of a generation in a roll log, see replay.
+
+    Rolls of rng (as in Die.roll) are appended to log as their offset from the lowest
+    possible value, in unsigned LEB128 varints.'''
+
+    def __init__(self, rng=None):
+        self.rng = rng
+        self.log = bytearray()
+
+    def randint(self, a, b):
+        value = (self.rng or random).randint(a, b)
+        offset = value - a
+        while offset >= 0x80:
+            self.log.append(offset & 0x7f | 0x80)
+            offset >>= 7
+        self.log.append(offset)
+        return value
+
+class RollReplayer:
+    '''Random state rolling the values of a roll log written by RollRecorder.'''
+
+    def __init__(self, log):
+        self.log = bytes(log)
+        self.position = 0
+
+    def randint(self, a, b):
+        offset = 0
+        shift = 0
+        while True:
+            if self.position >= len(self.log):
+                raise ValueError('roll log too short')
+            byte = self.log[self.position]
+            self.position += 1
+            offset |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        if offset > b - a:
+            raise ValueError('roll log does not match the tables')
+        return a + offset
 
 generators = {}
 
+# Widest roll span indexed directly by a Generator lookup table, wider spans use bisect.
+LOOKUP_MAX_SPAN = 1024
+
 Entry = collections.namedtuple('Entry', ('min_result', 'outcomes'), defaults=(None,))
 
 GenerateAction = collections.namedtuple('GenerateAction',
@@ -39,1105 +265,2117 @@ GenerateAction = collections.namedtuple('GenerateAction',
                                         defaults=(None, None, 1, True))
 
 class Generator:
-    def __init__(self, name, dice, entries=None, associated_generators=None):
+    def __init__(self, name, dice, entries=None, associated_generators=None, register=True):
         self.name = name
         self.dice = dice
         self.entries = entries
         self.associated_generators = associated_generators
-        self._register()
-
-    def _select_outcomes(self, result):
-        previous_entry = self.entries[0]
-        for entry in self.entries[1:]:
-            if previous_entry.min_result <= result < entry.min_result:
-                return previous_entry.outcomes
-            else:
-                previous_entry = entry
-        return previous_entry.outcomes
-
-    def _resolve(self, to_resolve, associated=True):
-        if isinstance(to_resolve, GenerateAction):
-            subgenerator = generators[to_resolve.generator_name]
-            try:
-                repeat = to_resolve.repeat.roll()
-            except AttributeError:
-                repeat = to_resolve.repeat
-            if repeat > 1:
-                return [subgenerator.generate(dice=to_resolve.dice, associated=associated)
-                        for _ in range(repeat)]
-            else:
-                return subgenerator.generate(dice=to_resolve.dice, associated=associated)
-        elif to_resolve in generators:
-            return generators[to_resolve].generate()
+        if register:
+            self._register()
         else:
-            return [to_resolve]
+            self._compile()
+
+    def _compile(self):
+        '''Precompute a roll -> outcomes index covering the entries and the dice range.'''
+        self._lookup = None
+        self._lookup_indexes = None
+        self._lookup_offset = 0
+        self._links = ()
+        self._linked_lookup = None
+        self._linked_associated = ()
+        self._is_leaf = False
+        self._min_results = None
+        self._entry_probabilities = {}
+        if not self.entries:
+            return
+        min_results = [entry.min_result for entry in self.entries]
+        if min_results == sorted(min_results):
+            self._min_results = min_results
+        low = min(min(min_results), self.dice.minimum)
+        high = max(max(min_results), self.dice.maximum)
+        if high - low < LOOKUP_MAX_SPAN:
+            self._lookup_offset = low
+            self._lookup_indexes = tuple(self._entry_index(result)
+                                         for result in range(low, high + 1))
+            self._lookup = tuple(self.entries[index].outcomes for index in self._lookup_indexes)
+
+    def _link(self, registry=None):
+        '''Resolves outcomes to Link or literal texts, see link_generators.
+
+        Names are resolved in registry, generators by default.'''
+        registry = generators if registry is None else registry
+        self._links = tuple(tuple(_link_outcome(outcome, registry) for outcome in entry.outcomes)
+                            for entry in self.entries or ())
+        if self._lookup_indexes is not None:
+            self._linked_lookup = tuple(self._links[index] for index in self._lookup_indexes)
+        self._linked_associated = tuple(_link_outcome(outcome, registry)
+                                        for outcome in self.associated_generators or ())
+        # Leaf generators only produce literal texts, a roll selects their whole subtree.
+        self._is_leaf = not self._linked_associated and all(
+            isinstance(link, str) for links in self._links for link in links)
 
-    def generate(self, dice=None, associated=True):
-        generated_texts = [self.name]
+    def _select_outcomes(self, result):
+        if self._lookup is not None:
+            index = result - self._lookup_offset
+            if 0 <= index < len(self._lookup):
+                return self._lookup[index]
+        return self.entries[self._entry_index(result)].outcomes
+
+    def _select_links(self, result):
+        if self._linked_lookup is not None:
+            index = result - self._lookup_offset
+            if 0 <= index < len(self._linked_lookup):
+                return self._linked_lookup[index]
+        return self._links[self._entry_index(result)]
+
+    def _entry_index(self, result):
+        if self._min_results is not None:
+            index = bisect.bisect_right(self._min_results, result) - 1
+            # Rolls below the first entry fall on the last one, as with the linear scan.
+            return index if index >= 0 else len(self.entries) - 1
+        index = 0
+        for next_index in range(1, len(self.entries)):
+            if self.entries[index].min_result <= result < self.entries[next_index].min_result:
+                return index
+            index = next_index
+        return index
+
+    def entry_probabilities(self, dice=None):
+        '''Exact probability of selecting each entry, as a list of (entry, Fraction).'''
+        if not self.entries:
+            return []
+        dice = dice or self.dice
+        if dice not in self._entry_probabilities:
+            probabilities = [Fraction(0)] * len(self.entries)
+            for result, probability in dice.distribution().items():
+                probabilities[self._entry_index(result)] += probability
+            self._entry_probabilities[dice] = probabilities
+        return list(zip(self.entries, self._entry_probabilities[dice]))
+
+    def leaf_probabilities(self, dice=None, associated=True):
+        '''Probability that a result of this generator contains each literal text, as
+        {(generator name, text): probability}.
+
+        Repeated and recursive generations of a table are accounted for, see
+        ExpectationModel.reach_probabilities: the values are floats solved up to the tolerance
+        of expectation_model, not Fractions.'''
+        return expectation_model.reach_probabilities(self.name, dice, associated)
+
+    def generate(self, dice=None, associated=True, rng=None, max_depth=None, max_nodes=None,
+                 require=(), exclude=(), record=False):
+        '''require and exclude are texts or generator names that the result must all contain,
+        and must not contain, see ExpectationModel.sample. Budgets cannot be combined with them.
+
+        With record, returns (result, roll log): the bytes rebuilding the result with replay.'''
+        if record:
+            recorder = RollRecorder(rng)
+            result = self.generate(dice, associated, recorder, max_depth, max_nodes, require,
+                                   exclude)
+            return result, bytes(recorder.log)
+        if isinstance(require, str):
+            require = (require,)
+        if isinstance(exclude, str):
+            exclude = (exclude,)
+        if require or exclude:
+            if max_depth is not None or max_nodes is not None:
+                raise ValueError('budgets cannot be used with require or exclude')
+            return expectation_model.sample(self.name, require, exclude, dice, associated, rng)
+        return Resolver(max_depth, max_nodes, rng).generate(self, dice, associated)
+
+    def generate_many(self, n, seed=None, dice=None, associated=True):
+        '''Generate n trees at once, rolling each table level in a single numpy draw.
+
+        Returns a list of n trees in the same format as generate().'''
+        try:
+            rng = _import_numpy().random.default_rng(seed)
+        except ImportError as error:
+            raise ImportError('generate_many requires numpy') from error
+        if _linked_version != _registry_version:
+            link_generators()
+        return self._generate_many(n, rng, dice, associated)
+
+    def _generate_many(self, n, rng, dice=None, associated=True, entry_counts=None):
+        '''entry_counts, a Counter, counts the (generator name, entry index) selected.'''
+        generated_texts_list = [[self.name] for _ in range(n)]
+        if n == 0:
+            return generated_texts_list
         if self.entries:
-            result = self.dice.roll() if not dice else dice.roll()
-            outcomes = self._select_outcomes(result)
-            #print(outcomes)
-            for outcome in outcomes:
-                generated_texts.append(self._resolve(outcome, associated=associated))
+            results = (dice or self.dice).roll_many(n, rng)
+            for index, rows in self._group_rows(results):
+                if entry_counts is not None:
+                    entry_counts[self.name, index] += len(rows)
+                for link in self._links[index]:
+                    resolved = self._resolve_many(link, len(rows), rng, associated,
+                                                  entry_counts)
+                    for row, generated_text in zip(rows, resolved):
+                        generated_texts_list[row].append(generated_text)
         if associated:
+            for link in self._linked_associated:
+                resolved = self._resolve_many(link, n, rng, associated, entry_counts)
+                for generated_texts, generated_text in zip(generated_texts_list, resolved):
+                    generated_texts.append(generated_text)
+        return generated_texts_list
+
+    def _group_rows(self, results):
+        '''Yields (entry index, rows) for each entry selected by the results array.'''
+        if self._min_results is None:
+            groups = collections.defaultdict(list)
+            for row, result in enumerate(results.tolist()):
+                groups[self._entry_index(result)].append(row)
+            yield from groups.items()
+            return
+        indexes = numpy.searchsorted(self._min_results, results, side='right') - 1
+        indexes[indexes < 0] = len(self.entries) - 1
+        for index in numpy.unique(indexes).tolist():
+            yield index, numpy.flatnonzero(indexes == index).tolist()
+
+    def _resolve_many(self, link, n, rng, associated=True, entry_counts=None):
+        if isinstance(link, Link):
+            if not link.inherit_associated:
+                associated = True
             try:
-                for generator in self.associated_generators:
-                    generated_texts.append(self._resolve(generator, associated=associated))
-            except TypeError:
-                pass
-        return generated_texts
+                repeats = link.repeat.roll_many(n, rng).tolist()
+            except AttributeError:
+                repeats = [link.repeat] * n
+            counts = [repeat if repeat > 1 else 1 for repeat in repeats]
+            generated = link.generator._generate_many(sum(counts), rng, link.dice, associated,
+                                                      entry_counts)
+            resolved = []
+            start = 0
+            for repeat, count in zip(repeats, counts):
+                if repeat > 1:
+                    resolved.append(generated[start:start + count])
+                else:
+                    resolved.append(generated[start])
+                start += count
+            return resolved
+        else:
+            return [[link] for _ in range(n)]
 
     def _recursive_print(self, generated_texts, indent=None, is_last=True):
-        if indent is None:
-            indent = ''
-        if isinstance(generated_texts[0], str):
-            node_name = generated_texts[0]
-            if is_last:
-                print(indent + ' └─' + node_name)
-                indent += '   '
-            else:
-                print(indent + ' ├─' + node_name)
-                indent += ' │ '
-            for i, generated_text in enumerate(generated_texts[1:]):
-                self._recursive_print(generated_text, indent, (i == len(generated_texts[1:]) - 1))
-        else:
-            for i, generated_text in enumerate(generated_texts):
-                self._recursive_print(generated_text, indent, False)
+        sys.stdout.write(render_tree(generated_texts, indent or '', is_last))
 
-    def generate_print(self, depth=0):
-        generated_texts = self.generate()
+    def generate_print(self, depth=0, rng=None):
+        generated_texts = self.generate(rng=rng)
         #print(generated_texts)
         self._recursive_print(generated_texts)
+        return generated_texts
 
     def _register(self):
+        global _registry_version
+        self._compile()
         generators[self.name] = self
-
-
-template = '''
-Generator('', d12,
-          (Entry(1, ('',)),
-           Entry(2, ('',)),
-           Entry(3, ('',)),
-           Entry(4, ('',)),
-           Entry(5, ('',)),
-           Entry(6, ('',)),
-           Entry(7, ('',)),
-           Entry(8, ('',)),
-           Entry(9, ('',)),
-           Entry(10, ('',)),
-           Entry(11, ('',)),
-           Entry(12, ('',))),
-          associated_generators=('',))
-'''
-
-# DISCOVERY ----------------------------------------------------------------------------------------
-
-Generator('discovery', d12,
-          (Entry(1, ('unnatural feature',
-                     'How does it affect its surroundings ?')),
-           Entry(2, ('natural feature',
-                     'Describe how they notice it and what sets it appart ?')),
-           Entry(5, ('evidence',
-                     'Consider the implications and be ready for them to take the bait.')),
-           Entry(7, ('creature',
-                     'Not an immediate threat but might become one.')),
-           Entry(9, ('structure',
-                     'Who built it ? Is it connected to anything else they made nearby ?'))))
-
-Generator('unnatural feature', d12,
-          (Entry(1, ('unnatural feature arcane',)),
-           Entry(10, ('unnatural feature planar',)),
-           Entry(12, ('unnatural feature divine',))))
-
-Generator('unnatural feature arcane', d12,
-          (Entry(1, ('residue',)),
-           Entry(3, ('blight',)),
-           Entry(6, ('alteration/mutation',)),
-           Entry(8, ('enchantment',)),
-           Entry(11, ('source/repository',))),
-          associated_generators=('alignement', 'magic type'))
-
-Generator('unnatural feature planar', d12,
-          (Entry(1, ('distortion/warp',)),
-           Entry(5, ('portal/gate',)),
-           Entry(9, ('rift/tear',)),
-           Entry(11, ('outpost',))),
-          associated_generators=('alignement', 'element'))
-
-Generator('unnatural feature divine', d12,
-          (Entry(1, ('mark/sign',)),
-           Entry(4, ('cursed place',)),
-           Entry(7, ('hallowed place',)),
-           Entry(10, ('watched place',)),
-           Entry(12, ('presence',))),
-          associated_generators=('alignement', 'aspect'))
-
-Generator('natural feature', d12,
-          (Entry(1, ('lair',)),
-           Entry(3, ('obstacle',)),
-           Entry(5, ('terrain change',)),
-           Entry(8, ('water feature',)),
-           Entry(10, ('landmark',)),
-           Entry(12, ('resource',))),
-          )
-
-Generator('lair', d12,
-          (Entry(1, ('burrow',)),
-           Entry(4, ('cave/tunnels',)),
-           Entry(8, ('nest/aerie',)),
-           Entry(10, ('hive',)),
-           Entry(11, ('structure ruin',))),
-          associated_generators=('visibility',
-                                 'creature responsible',
-                                 'creature'))
-
-Generator('obstacle', d12,
-          (Entry(1, ('difficult ground (specific to terrain)',)),
-           Entry(6, ('cliff/crevasse/chasm',)),
-           Entry(9, ('ravine/gorge',)),
-           Entry(11, ('oddity',))))
-
-Generator('terrain change', d12,
-          (Entry(1, ('limited area of another terrain type',
-                     'terrain')),
-           Entry(5, ('crevice/hole/pit/cave',)),
-           Entry(7, ('altitude change',)),
-           Entry(9, ('canyon/valley',)),
-           Entry(11, ('rise/peak in distance',))))
-
-Generator('water feature', d12,
-          (Entry(1, ('spring/hotspring',)),
-           Entry(2, ('waterfall/geyser',)),
-           Entry(3, ('creek/stream/brook',)),
-           Entry(7, ('pond/lake',)),
-           Entry(9, ('river',)),
-           Entry(11, ('sea/ocean',))))
-
-Generator('landmark', d12,
-          (Entry(1, ('water-based (waterfall, geyser, ...)',)),
-           Entry(4, ('plant-based (ancient tree, giant flowers, ...)',)),
-           Entry(7, ('earth-based (peak, formation, crater, ...)',)),
-           Entry(11, ('oddity',))))
-
-Generator('resource', d12,
-          (Entry(1, ('game/fruit/vegetable',)),
-           Entry(5, ('herb/spice/dye source',)),
-           Entry(7, ('timber/stone',)),
-           Entry(10, ('ore (copper, iron, ...)',)),
-           Entry(12, ('precious metal/gems',))),
-          associated_generators=('size',
-                                 'visibility'))
-
-Generator('evidence', d12,
-          (Entry(1, ('tracks/spoor',)),
-           Entry(7, ('remains/debris',
-                     'age',
-                     'visibility')),
-           Entry(11, ('stash/cache',))))
-
-Generator('tracks/spoor', d12,
-          (Entry(1, ('faint/unclear',)),
-           Entry(4, ('definite/clear',)),
-           Entry(7, ('multiple',)),
-           Entry(9, ('signs of violence',)),
-           Entry(11, ('trail of blood/other',))),
-          associated_generators=('age',
-                                 'creature responsible',
-                                 'creature'))
-
-Generator('remains/debris', d12,
-          (Entry(1, ('bones',)),
-           Entry(5, ('corpse/carcass',)),
-           Entry(8, ('site of violence',)),
-           Entry(10, ('junk/refuse',)),
-           Entry(11, ('lost supplies/cargo',)),
-           Entry(12, ('tools/weapons/armor',))))
-
-Generator('stash/cache', d12,
-          (Entry(1, ('trinkets/coins',)),
-           Entry(4, ('tools/weapons/armor',)),
-           Entry(6, ('map',)),
-           Entry(8, ('food/supplies',)),
-           Entry(10, ('treasure',))))
-
-Generator('structure', d12,
-          (Entry(1, ('structure enigmatic',)),
-           Entry(2, ('structure infrastructure',)),
-           Entry(4, ('structure dwelling',)),
-           Entry(5, ('structure burial/religious',)),
-           Entry(7, ('steading',)),
-           Entry(9, ('structure ruin',))))
-
-Generator('structure enigmatic', d12,
-          (Entry(1, ('earthworks',)),
-           Entry(5, ('megalith',)),
-           Entry(9, ('statue/idol/totem',)),
-           Entry(12, ('oddity',))),
-          associated_generators=(GenerateAction('age',Dice([d8], 4)),
-                                 GenerateAction('size',Dice([d8], 4)),
-                                 'visibility'))
-
-Generator('structure infrastructure', d12,
-          (Entry(1, ('track/path',)),
-           Entry(5, ('road',)),
-           Entry(9, ('bridge/ford',)),
-           Entry(11, ('mine/quarry',)),
-           Entry(12, ('aqueduct/canal/portal',))),
-          associated_generators=('creature responsible',
-                                 GenerateAction('creature', Dice([d4],4)),))
-
-Generator('structure dwelling', d12,
-          (Entry(1, ('campsite',)),
-           Entry(4, ('hovel/hut',)),
-           Entry(7, ('farm',)),
-           Entry(9, ('inn/roadhouse',)),
-           Entry(11, ('tower/keep/estate',))),
-          associated_generators=('creature responsible',
-                                 GenerateAction('creature', Dice([d4],4)),))
-
-Generator('structure burial/religious', d12,
-          (Entry(1, ('grave marker/barrow',)),
-           Entry(3, ('graveyard/necropolis',)),
-           Entry(5, ('tomb/crypt',)),
-           Entry(7, ('shrine',)),
-           Entry(10, ('temple/retreat',)),
-           Entry(12, ('great temple',))),
-          associated_generators=('alignement',
-                                 'aspect',
-                                 'creature responsible',
-                                 GenerateAction('creature', Dice([d4],+4))))
-
-Generator('structure ruin', d12,
-          (Entry(1, (GenerateAction('structure infrastructure', Dice([d6],+6), associated=False),)),
-           Entry(3, (GenerateAction('structure dwelling', Dice([d8],+4), associated=False),)),
-           Entry(5, (GenerateAction('structure burial/religious', Dice([d8],+4), associated=False),)),
-           Entry(7, (GenerateAction('steading', Dice([d10],+2), associated=False),)),
-           Entry(9, ('dungeon',))),
-          associated_generators=(GenerateAction('age', Dice([d8],+4)),
-                                 'ruination',
-                                 'visibility'))
-
-Generator('steading', d12,
-          (Entry(1, ('village',)),
-           Entry(6, ('town',)),
-           Entry(9, ('keep',)),
-           Entry(12, ('city',))))
-
-# DUNGEON ------------------------------------------------------------------------------------------
-
-Generator('dungeon', d12,
-          (Entry(1, ('dungeon small',)),
-           Entry(4, ('dungeon medium',)),
-           Entry(10, ('dungeon large',)),
-           Entry(12, ('dungeon huge',))))
-
-Generator('dungeon small', d12,
-          associated_generators=('dungeon function',
-                                 'dungeon themes',
-                                 GenerateAction('dungeon theme', repeat=d4),
-                                 'areas (1d6+2)',
-                                 'dungeon builder',
-                                 'dungeon ruination'))
-
-Generator('dungeon medium', d12,
-          associated_generators=('dungeon function',
-                                 'dungeon themes',
-                                 GenerateAction('dungeon theme', repeat=d6),
-                                 'areas (2d6+4)',
-                                 'dungeon builder',
-                                 'dungeon ruination'))
-
-Generator('dungeon large', d12,
-          associated_generators=('dungeon function',
-                                 'dungeon themes',
-                                 GenerateAction('dungeon theme', repeat=Dice([d6],1)),
-                                 'areas (3d6+6)',
-                                 'dungeon builder',
-                                 'dungeon ruination'))
-
-Generator('dungeon huge', d12,
-          associated_generators=('dungeon function',
-                                 'dungeon themes',
-                                 GenerateAction('dungeon theme', repeat=Dice([d6],2)),
-                                 'areas (4d6+10)',
-                                 'dungeon builder',
-                                 'dungeon ruination'))
-
-Generator('dungeon function', d12,
-          (Entry(1, ('source/portal',)),
-           Entry(2, ('mine',)),
-           Entry(3, ('tomb/crypt',)),
-           Entry(5, ('prison',)),
-           Entry(6, ('lair/den/hideout',)),
-           Entry(8, ('stronghold/sanctuary',)),
-           Entry(10, ('shrine/temple/oracle',)),
-           Entry(11, ('archive/library',)),
-           Entry(12, ('unknown/mystery',))))
-
-Generator('dungeon theme', d12,
-          (Entry(1, ('dungeon theme mundane',)),
-           Entry(6, ('dungeon theme unusual',)),
-           Entry(10, ('dungeon theme extroardinary',))))
-
-Generator('dungeon theme mundane', d12,
-          (Entry(1, ('rot/decay',)),
-           Entry(2, ('torture/agony',)),
-           Entry(3, ('madness',)),
-           Entry(4, ('all is lost',)),
-           Entry(5, ('noble sacrifice',)),
-           Entry(6, ('savage fury',)),
-           Entry(7, ('survival',)),
-           Entry(8, ('criminal activity',)),
-           Entry(9, ('secrets/treachery',)),
-           Entry(10, ('tricks and traps',)),
-           Entry(11, ('invasion/infestation',)),
-           Entry(12, ('factions at war',))))
-
-Generator('dungeon theme unusual', d12,
-          (Entry(1, ('creation/invention',)),
-           Entry(2, ('element',)),
-           Entry(3, ('knowledge/learning',)),
-           Entry(4, ('growth/expansion',)),
-           Entry(5, ('deepening mystery',)),
-           Entry(6, ('transformation/change',)),
-           Entry(7, ('chaos and destruction',)),
-           Entry(8, ('shadowy forces',)),
-           Entry(9, ('forbidden knowledge',)),
-           Entry(10, ('poison/disease',)),
-           Entry(11, ('corruption/blight',)),
-           Entry(12, ('impending disaster',))))
-
-Generator('dungeon theme extroardinary', d12,
-          (Entry(1, ('scheming evil',)),
-           Entry(2, ('divination/scrying',)),
-           Entry(3, ('blasphemy',)),
-           Entry(4, ('arcane research',)),
-           Entry(5, ('occult forces',)),
-           Entry(6, ('an ancient curse',)),
-           Entry(7, ('mutation',)),
-           Entry(8, ('the unquiet dead',)),
-           Entry(9, ('bottomless hunger',)),
-           Entry(10, ('incredible power',)),
-           Entry(11, ('unspeakable horrors',)),
-           Entry(12, ('holy war',))))
-
-Generator('dungeon ruination', d12,
-          (Entry(1, ('arcane disaster',)),
-           Entry(2, ('damnation/curse',)),
-           Entry(3, ('earthquake/fire/flood',)),
-           Entry(5, ('plague/famine/drought',)),
-           Entry(7, ('overrun by monsters',)),
-           Entry(9, ('war/invasion',)),
-           Entry(11, ('depleted resources',)),
-           Entry(12, ('better prospects elsewhere',))))
-
-Generator('dungeon builder', d12,
-          (Entry(1, ('aliens/precursors',)),
-           Entry(2, ('demigod/demon',)),
-           Entry(3, ('natural (caves, etc.)',)),
-           Entry(5, ('religious order/cult',)),
-           Entry(6, ('humanoid',)),
-           Entry(8, ('dwarves/gnomes',)),
-           Entry(10, ('elves',)),
-           Entry(11, ('wizard/madman',)),
-           Entry(12, ('monarch/warlord',))))
-
-Generator('dungeon exploration', d12,
-          (Entry(1, ('unthemed area, common, empty',)),
-           Entry(2, ('unthemed area, common','dungeon danger')),
-           Entry(3, ('unthemed area, common','dungeon discovery','dungeon danger')),
-           Entry(5, ('unthemed area, common','dungeon discovery')),
-           Entry(7, ('themed area, common','dungeon danger')),
-           Entry(8, ('themed area, common','dungeon discovery','dungeon danger')),
-           Entry(9, ('themed area, common','dungeon discovery')),
-           Entry(10, ('themed area, unique','dungeon danger')),
-           Entry(11, ('themed area, unique','dungeon discovery','dungeon danger')),
-           Entry(12, ('themed area, unique','dungeon discovery'))))
-
-Generator('dungeon discovery', d12,
-          (Entry(1, ('dungeon discovery dressing',)),
-           Entry(4, ('dungeon discovery feature',)),
-           Entry(10, ('dungeon discovery find',))))
-
-Generator('dungeon discovery dressing', d12,
-          (Entry(1, ('junk/debris',)),
-           Entry(2, ('tracks/marks',)),
-           Entry(3, ('signs of battle',)),
-           Entry(4, ('writing/carving',)),
-           Entry(5, ('warning',)),
-           Entry(6, ('dead creature',
-                     'creature')),
-           Entry(7, ('bones/remains',)),
-           Entry(8, ('book/scroll/map',)),
-           Entry(9, ('broken door/wall',)),
-           Entry(10, ('breeze/wind/smell',)),
-           Entry(11, ('lichen/moss/fungus',)),
-           Entry(12, ('oddity',))))
-
-Generator('dungeon discovery feature', d12,
-          (Entry(1, ('cave-in/collapse',)),
-           Entry(2, ('pit/shaft/chasm',)),
-           Entry(3, ('pillars/columns',)),
-           Entry(4, ('locked door/gate',)),
-           Entry(5, ('alcoves/niches',)),
-           Entry(6, ('bridge/stairs/ramp',)),
-           Entry(7, ('fountain/well/pool',)),
-           Entry(8, ('puzzle',)),
-           Entry(9, ('altar/dais/platform',)),
-           Entry(10, ('statue/idol',)),
-           Entry(11, ('magic pool/statue/idol',)),
-           Entry(12, ('connection to another dungeon',))))
-
-Generator('dungeon discovery find', d12,
-          (Entry(1, ('trinkets',)),
-           Entry(2, ('tools',)),
-           Entry(3, ('weapons/armor',)),
-           Entry(4, ('supplies/trade goods',)),
-           Entry(5, ('coins/gems/jewelry',)),
-           Entry(6, ('poisons/potions',)),
-           Entry(7, ('adventurer/captive',)),
-           Entry(8, ('magic item',)),
-           Entry(9, ('scroll/book',)),
-           Entry(10, ('magic weapon/armor',)),
-           Entry(11, ('artifact',)),
-           Entry(12, ('dungeon discovery find','dungeon discovery find'))))
-
-Generator('dungeon danger', d12,
-          (Entry(1, ('dungeon danger trap',)),
-           Entry(5, ('dungeon danger creature',)),
-           Entry(12, ('dungeon danger entity',))))
-
-Generator('dungeon danger trap', d12,
-          (Entry(1, ('alarm',)),
-           Entry(2, ('ensnaring/paralyzing',)),
-           Entry(3, ('pit',)),
-           Entry(4, ('crushing',)),
-           Entry(5, ('piercing/puncturing',)),
-           Entry(6, ('chopping/slashing',)),
-           Entry(7, ('confusing (maze, etc.)',)),
-           Entry(8, ('gaz (poison, etc.)',)),
-           Entry(9, ('element',)),
-           Entry(10, ('ambush',)),
-           Entry(11, ('magical',)),
-           Entry(12, ('dungeon danger trap','dungeon danger trap'))))
-
-Generator('dungeon danger creature', d12,
-          (Entry(1, ('waiting in ambush',)),
-           Entry(2, ('fighting/squabbling',)),
-           Entry(3, ('prowling/on patrol',)),
-           Entry(4, ('looking for food',)),
-           Entry(5, ('eating/resting',)),
-           Entry(6, ('guarding',)),
-           Entry(7, ('on the move',)),
-           Entry(8, ('searching/scavenging',)),
-           Entry(9, ('returning to den',)),
-           Entry(10, ('making plans',)),
-           Entry(11, ('sleeping',)),
-           Entry(12, ('dying',))),
-          associated_generators=('creature',))
-
-Generator('dungeon danger entity', d12,
-          (Entry(1, ('alien interloper',)),
-           Entry(2, ('vermin lord',)),
-           Entry(3, ('criminal mastermind',)),
-           Entry(4, ('warlord',)),
-           Entry(5, ('high priest',)),
-           Entry(6, ('oracle',)),
-           Entry(7, ('wizard/witch/alchemist',)),
-           Entry(8, ('monster lord',
-                     'monster')),
-           Entry(9, ('evil spirit/ghost',)),
-           Entry(10, ('undead lord (lich, etc.)',)),
-           Entry(11, ('demon',)),
-           Entry(12, ('dark god',))))
-
-# DANGERS ------------------------------------------------------------------------------------------
-
-Generator('danger', d12,
-          (Entry(1, ('unnatural entity (describt it, creepy, twisted, awe-inspinring)',
-                     'unnatural entity')),
-           Entry(2, ('hazard (threaten them and their stuff)',
-                     'hazard')),
-           Entry(7, ('creature',))))
-
-Generator('unnatural entity', d12,
-          (Entry(1, ('unnatural entity undead',)),
-           Entry(9, ('unnatural entity planar',)),
-           Entry(12, ('unnatural entity divine',))))
-
-Generator('unnatural entity undead', d12,
-          (Entry(1, ('haunt/wisp',)),
-           Entry(5, ('ghost/spectre',)),
-           Entry(9, ('banshee',)),
-           Entry(10, ('wraith/wight',)),
-           Entry(12, ('spirit lord/master',))),
-          associated_generators=('ability',
-                                 'activity',
-                                 'alignement',
-                                 'disposition'))
-
-Generator('unnatural entity planar', d12,
-          (Entry(1, ('imp (Small)',)),
-           Entry(4, ('lesser elemental',)),
-           Entry(7, ('lesser demon/horror',)),
-           Entry(10, ('greater elemental',)),
-           Entry(11, ('greater demon/horror',)),
-           Entry(12, ('devil/elemental lord',))),
-          associated_generators=('ability',
-                                 'activity',
-                                 'alignement',
-                                 'disposition',
-                                 'element',
-                                 'feature',
-                                 'monster tag'))
-
-Generator('unnatural entity divine', d12,
-          (Entry(1, ('agent',)),
-           Entry(6, ('champion',)),
-           Entry(10, ('army (Horde)',)),
-           Entry(12, ('avatar',))),
-          associated_generators=('ability',
-                                 'activity',
-                                 'alignement',
-                                 'disposition',
-                                 'element',
-                                 'feature',
-                                 'monster tag'))
-
-Generator('hazard', d12,
-          (Entry(1, ('hazard unnatural',)),
-           Entry(3, ('hazard natural',)),
-           Entry(11, ('hazard trap',))))
-
-Generator('hazard unnatural', d12,
-          (Entry(1, ('taint/blight/curse',)),
-           Entry(4, ('arcane trap/effect',)),
-           Entry(9, ('planar trap/effect',)),
-           Entry(12, ('divine',))),
-          associated_generators=('aspect',
-                                 'visibility'))
-
-Generator('hazard natural', d12,
-          (Entry(1, ('blinding mist/fog',)),
-           Entry(3, ('bog/mire/quicksand',)),
-           Entry(5, ('pitfall/sinkhole/chasm',)),
-           Entry(8, ('poison/disease',)),
-           Entry(10, ('flood/fire/tornado',)),
-           Entry(12, ('oddity',))))
-
-Generator('hazard trap', d12,
-          (Entry(1, ('alarm',)),
-           Entry(3, ('ensnaring/paralysing',)),
-           Entry(6, ('injurious (pit, etc...)',)),
-           Entry(9, ('gas/fire/poison',)),
-           Entry(10, ('ambush',))),
-          associated_generators=('aspect',
-                                 'visibility',
-                                 'creature responsible',
-                                 'creature'))
-
-# CREATURES ----------------------------------------------------------------------------------------
-
-Generator('creature', d12,
-          (Entry(1, ('beast',)),
-           Entry(5, ('human',
-                     'npc occupation',
-                     'npc trait',
-                     'activity',
-                     'alignement',
-                     'disposition',
-                     'group number')),
-           Entry(7, ('humanoid',)),
-           Entry(9, ('monster',))))
-
-Generator('beast', d12,
-          (Entry(1, ('beast earthbound',)),
-           Entry(8, ('beast airborne',)),
-           Entry(11, ('beast water-going',))),
-          associated_generators=('activity',
-                                 'disposition',
-                                 'group number',
-                                 'size'))
-
-Generator('beast earthbound', d12,
-          (Entry(1, ('termite/tick/louse',)),
-           Entry(2, ('snail/slug/worm',)),
-           Entry(3, ('ant/centipede/scorpion',)),
-           Entry(4, ('snake/lizard',)),
-           Entry(5, ('vole/rat/weasel',)),
-           Entry(6, ('boar/pig',)),
-           Entry(7, ('dog/fox/wolf',)),
-           Entry(8, ('cat/lion/panther',)),
-           Entry(9, ('deer/horse/camel',)),
-           Entry(10, ('ox/rhino',)),
-           Entry(11, ('bear/ape/gorilla',)),
-           Entry(12, ('mammoth/dinosaur',))))
-
-Generator('beast airborne', d12,
-          (Entry(1, ('mosquito/firefly',)),
-           Entry(2, ('locust/dragonfly/moth',)),
-           Entry(3, ('bee/wasp',)),
-           Entry(4, ('chicken/duck/goose',)),
-           Entry(5, ('songbird/parrot',)),
-           Entry(6, ('gull/waterbird',)),
-           Entry(7, ('heron/crane/stork',)),
-           Entry(8, ('crow/raven',)),
-           Entry(9, ('hawk/falcon',)),
-           Entry(10, ('eagle/owl',)),
-           Entry(11, ('condor',)),
-           Entry(12, ('pteranodon',))))
-
-Generator('beast water-going', d12,
-          (Entry(1, ('insect',)),
-           Entry(2, ('jelly/anemone',)),
-           Entry(3, ('clam/oyster/snail',)),
-           Entry(4, ('eel/snake',)),
-           Entry(5, ('frog/toad',)),
-           Entry(6, ('fish',)),
-           Entry(7, ('crab/lobster',)),
-           Entry(8, ('turtle',)),
-           Entry(9, ('alligator/crocodile',)),
-           Entry(10, ('dolphin/shark',)),
-           Entry(11, ('squid/octopus',)),
-           Entry(12, ('whale',))))
-
-Generator('humanoid', d12,
-          (Entry(1, ('humanoid common',)),
-           Entry(8, ('humanoid uncommon',)),
-           Entry(11, ('humanoid hybrid',))),
-          associated_generators=('npc occupation',
-                                 'npc trait',
-                                 'activity',
-                                 'disposition',
-                                 'group number',
-                                 'alignement'))
-
-Generator('humanoid common', d12,
-          (Entry(1, ('halfling (Small)',)),
-           Entry(4, ('goblin/kobold (Small)',)),
-           Entry(6, ('dwarf/gnome (Small)',)),
-           Entry(8, ('orc/hobgobelin/gnoll',)),
-           Entry(10, ('half-elf/half-orc/etc...',)),
-           Entry(12, ('elf',))))
-
-Generator('humanoid uncommon', d12,
-          (Entry(1, ('fey (Tiny)',)),
-           Entry(2, ('catfolk/dogfolk',)),
-           Entry(4, ('lizardfolk/merfolk',)),
-           Entry(7, ('birdfolk',)),
-           Entry(8, ('ogre/troll (Large)',)),
-           Entry(11, ('cyclops/giant (Large)',))))
-
-Generator('humanoid hybrid', d12,
-          (Entry(1, ('centaur',)),
-           Entry(3, ('werewolf/werebear',)),
-           Entry(6, ('werecreature: human + beast','beast')),
-           Entry(7, ('human + beast','beast')),
-           Entry(11, ('human + 2 beasts','beast','beast'))))
-
-Generator('monster', d12,
-          (Entry(1, ('monster unusual',)),
-           Entry(8, ('monster rare',)),
-           Entry(11, ('monster legendary',))),
-          associated_generators=('activity',
-                                 'disposition',
-                                 'size',
-                                 'alignement',
-                                 'group number',
-                                 'OPTIONAL',
-                                 'ability',
-                                 'adjective',
-                                 'age',
-                                 'aspect',
-                                 'condition',
-                                 'feature',
-                                 'monster tag'))
-
-Generator('monster unusual', d12,
-          (Entry(1, ('plant/fungus',)),
-           Entry(4, ('Undead Human',)),
-           Entry(6, ('Undead humanoid','humanoid')),
-           Entry(7, ('beast + beast','beast','beast')),
-           Entry(9, ('beast + ability','beast','ability')),
-           Entry(11, ('beast + feature','beast','feature'))))
-
-Generator('monster rare', d12,
-          (Entry(1, ('slime/ooze (Amorphous)',)),
-           Entry(4, ('creation (Construct)',)),
-           Entry(7, ('beast + oddity','beast','oddity')),
-           Entry(10, ('unnatural entity',))))
-
-Generator('monster legendary', d12,
-          (Entry(1, ('dragon/colossus (Huge)',)),
-           Entry(4, ('monster unusual + Huge','monster unusual')),
-           Entry(7, ('monster rare + Huge','monster rare')),
-           Entry(10, ('beast + dragon','beast')),
-           Entry(11, ('monster unusual + dragon','monster unusual')),
-           Entry(12, ('monster rare + dragon','monster rare'))))
-
-# NPC
-
-Generator('npc occupation', d12,
-          (Entry(1, ('criminal',)),
-           Entry(2, ('commoner',)),
-           Entry(7, ('tradesperson',)),
-           Entry(9, ('merchant',)),
-           Entry(11, ('specialist',)),
-           Entry(12, ('official',))))
-
-Generator('criminal', d12,
-          (Entry(1, ('bandit/brigand/thug',)),
-           Entry(3, ('thief',)),
-           Entry(5, ('bodyguard/tough',)),
-           Entry(7, ('burglar',)),
-           Entry(9, ('dealer/fence',)),
-           Entry(10, ('racketeer',)),
-           Entry(11, ('lieutenant',)),
-           Entry(12, ('boss',))))
-
-Generator('commoner', d12,
-          (Entry(1, ('housewife/husband',)),
-           Entry(2, ('hunter/gatherer',)),
-           Entry(4, ('farmer/herder',)),
-           Entry(7, ('laborer/servant',)),
-           Entry(9, ('driver/porter/guide',)),
-           Entry(10, ('sailor/soldier/guard',)),
-           Entry(11, ('clergy/monk',)),
-           Entry(12, ('apprentice/adventurer',))))
-
-Generator('tradesperson', d12,
-          (Entry(1, ('cobbler/furrier/tailor',)),
-           Entry(2, ('weaver/basketmaker',)),
-           Entry(3, ('potter/carpenter',)),
-           Entry(4, ('mason/baker/chandler',)),
-           Entry(5, ('cooper/wheelwright',)),
-           Entry(6, ('tanner/ropemaker',)),
-           Entry(7, ('smith/tinker',)),
-           Entry(8, ('stablekeeper/herbalist',)),
-           Entry(9, ('vintner/jeweler',)),
-           Entry(10, ('inkeeper/tavernkeeper',)),
-           Entry(11, ('artist/actor/minstrel',)),
-           Entry(12, ('armorer/weaponsmith',))))
-
-Generator('merchant', d12,
-          (Entry(1, ('general goods/outfitter',)),
-           Entry(4, ('raw materials',)),
-           Entry(5, ('grain/livestock',)),
-           Entry(6, ('ale/wine/spirits',)),
-           Entry(7, ('clothing/jewelry',)),
-           Entry(8, ('weapons/armor',)),
-           Entry(9, ('spices/tobacco',)),
-           Entry(10, ('labor/slaves',)),
-           Entry(11, ('books/scrolls',)),
-           Entry(12, ('magic supplies/items',))))
-
-Generator('specialist', d12,
-          (Entry(1, ('undertaker',)),
-           Entry(2, ('sage/scholar/wizard',)),
-           Entry(3, ('writer/illuminator',)),
-           Entry(4, ('perfumer',)),
-           Entry(5, ('architect/engineer',)),
-           Entry(6, ('locksmith/clockmaker',)),
-           Entry(7, ('physician/apothecary',)),
-           Entry(8, ('navigator/guide',)),
-           Entry(9, ('alchemist/astrologer',)),
-           Entry(10, ('spy/diplomat',)),
-           Entry(11, ('cartographer',)),
-           Entry(12, ('inventor',))))
-
-Generator('official', d12,
-          (Entry(1, ('town crier',)),
-           Entry(2, ('tax collector',)),
-           Entry(3, ('armiger/gentry',)),
-           Entry(5, ('reeve/sheriff/constable',)),
-           Entry(6, ('mayor/magistrate',)),
-           Entry(7, ('priest/bishop/abbot',)),
-           Entry(8, ('guildmaster',)),
-           Entry(9, ('knight/templar',)),
-           Entry(10, ('elder/high priest',)),
-           Entry(11, ('noble (baron, etc.)',)),
-           Entry(12, ('lord/lady/king/queen',))))
-
-Generator('npc trait', d12,
-          (Entry(1, ('npc trait physical appearance',)),
-           Entry(7, ('npc trait personality',)),
-           Entry(10, ('npc trait quirk',))))
-
-Generator('npc trait physical appearance', d12,
-          (Entry(1, ('disfigured (missing teeth, eye, etc.)',)),
-           Entry(2, ('lasting injury (bad leg, arm, etc.)',)),
-           Entry(3, ('tattooed/pockmarked/scarred',)),
-           Entry(4, ('unkempt/shabby/grubby',)),
-           Entry(5, ('big/thick/brawny',)),
-           Entry(6, ('small/scrawny/emaciated',)),
-           Entry(7, ('notable hair (wild, long, none, etc.)',)),
-           Entry(8, ('notable nose (big, hooked, etc.)',)),
-           Entry(9, ('notable eyes (blue, bloodshot, etc.)',)),
-           Entry(10, ('clean/well-dressed/well-groomed',)),
-           Entry(11, ('attractive/handsome/stunning',)),
-           Entry(12, ('they are [roll again] despite [a contradictory detail of your choice]','npc trait physical appearance', 'npc trait physical appearance'))))
-
-Generator('npc trait personality', d12,
-          (Entry(1, ('loner/alienated/antisocial',)),
-           Entry(2, ('cruel/belligerent/bully',)),
-           Entry(3, ('anxious/fearful/cowardly',)),
-           Entry(4, ('envious/covetous/greedy',)),
-           Entry(5, ('aloof/haughty/arrogant',)),
-           Entry(6, ('awkward/shy/self-loathing',)),
-           Entry(7, ('orderly/compulsive/controlling',)),
-           Entry(8, ('confident/impulsive/reckless',)),
-           Entry(9, ('kind/generous/compassionate',)),
-           Entry(10, ('easygoing/relaxed/peaceful',)),
-           Entry(11, ('cheerful/happy/optimistic',)),
-           Entry(12, ('they are [roll again] despite [a contradictory detail of your choice]','npc trait personality', 'npc trait personality'))))
-
-Generator('npc trait quirk', d12,
-          (Entry(1, ('insecure/racist/xenophobic',)),
-           Entry(2, ('addict (sweets, drugs, sex, etc.)',)),
-           Entry(3, ('phobia (spiders, fire, darkness, etc.)',)),
-           Entry(4, ('allergic/asthmatic/chronically ill',)),
-           Entry(5, ('skeptic/paranoid',)),
-           Entry(6, ('superstitious/devout/fanatical',)),
-           Entry(7, ('miser/pack-rat',)),
-           Entry(8, ('spendthrift/wastrel',)),
-           Entry(9, ('smart aleck/know-it-all',)),
-           Entry(10, ('artistic/dreamer/delusional',)),
-           Entry(11, ('naive/idealistic',)),
-           Entry(12, ('they are [roll again] despite [a contradictory detail of your choice]','npc trait quirk', 'npc trait quirk'))))
-
-# DETAILS ------------------------------------------------------------------------------------------
-
-Generator('ability', d12,
-          (Entry(1, ('bless/curse',)),
-           Entry(2, ('entangle/trap/snare',)),
-           Entry(3, ('poison/disease',)),
-           Entry(4, ('paralyze/petrify',)),
-           Entry(5, ('mimic/camouflage',)),
-           Entry(6, ('seduce/hypnotize',)),
-           Entry(7, ('dissolve/disintegrate',)),
-           Entry(8, ('magic type',)),
-           Entry(9, ('drain life/magic',)),
-           Entry(10, ('immunity:', 'element')),
-           Entry(11, ('read/control minds',)),
-           Entry(12, ('ability','ability'))))
-
-Generator('activity', d12,
-          (Entry(1, ('laying trap/ambush',)),
-           Entry(2, ('fighting/at war',)),
-           Entry(3, ('prowling/on patrol',)),
-           Entry(4, ('hunting/foraging',)),
-           Entry(5, ('eating/resting',)),
-           Entry(6, ('crafting/praying',)),
-           Entry(7, ('traveling/relocating',)),
-           Entry(8, ('exploring/lost',)),
-           Entry(9, ('returning home',)),
-           Entry(10, ('building/excavating',)),
-           Entry(11, ('sleeping',)),
-           Entry(12, ('dying',))))
-
-Generator('adjective', d12,
-          (Entry(1, ('slick/slimy',)),
-           Entry(2, ('rough/hard/sharp',)),
-           Entry(3, ('smooth/soft/dull',)),
-           Entry(4, ('corroded/rusty',)),
-           Entry(5, ('rotten/decaying',)),
-           Entry(6, ('broken/brittle',)),
-           Entry(7, ('stinking/smelly',)),
-           Entry(8, ('weak/thin/drained',)),
-           Entry(9, ('strong/fat/full',)),
-           Entry(10, ('pale/poor/shallow',)),
-           Entry(11, ('dark/rich/deep',)),
-           Entry(12, ('colorful',))))
-
-Generator('age', d12,
-          (Entry(1, ('being born/built',)),
-           Entry(2, ('young/recent',)),
-           Entry(5, ('middle-aged',)),
-           Entry(8, ('old',)),
-           Entry(10, ('ancient',)),
-           Entry(12, ('pre-historic',))))
-
-Generator('alignement', d12,
-          (Entry(1, ('Chaotic',)),
-           Entry(3, ('Evil',)),
-           Entry(5, ('Neutral',)),
-           Entry(9, ('Good',)),
-           Entry(11, ('Lawful',))))
-
-Generator('aspect', d12,
-          (Entry(1, ('power/strength',)),
-           Entry(2, ('trickery/dexterity',)),
-           Entry(3, ('time/constitution',)),
-           Entry(4, ('knowledge/intelligence',)),
-           Entry(5, ('nature/wisdom',)),
-           Entry(6, ('culture/charisma',)),
-           Entry(7, ('war/lies/discord',)),
-           Entry(8, ('peace/truth/balance',)),
-           Entry(9, ('hate/envy',)),
-           Entry(10, ('love/admiration',)),
-           Entry(11, ('element',)),
-           Entry(12, ('aspect','aspect'))))
-
-Generator('condition', d12,
-          (Entry(1, ('being built/born',)),
-           Entry(2, ('intact/healthy/stable',)),
-           Entry(5, ('occupied/active/alert',)),
-           Entry(8, ('worn/tired/weak',)),
-           Entry(10, ('vacant/lost',)),
-           Entry(11, ('ruined/defiled/dying',)),
-           Entry(12, ('disappeared/dead',))))
-
-Generator('disposition', d12,
-          (Entry(1, ('attacking',)),
-           Entry(2, ('hostile/aggressive',)),
-           Entry(5, ('cautious/doubtful',)),
-           Entry(7, ('fearful/fleeing',)),
-           Entry(8, ('neutral',)),
-           Entry(11, ('curious/hopeful',)),
-           Entry(12, ('friendly',))))
-
-Generator('element', d12,
-          (Entry(1, ('air',)),
-           Entry(3, ('earth',)),
-           Entry(5, ('fire',)),
-           Entry(7, ('water',)),
-           Entry(9, ('life',)),
-           Entry(11, ('death',))))
-
-Generator('feature', d12,
-          (Entry(1, ('heavily armored',)),
-           Entry(2, ('winged/flying',)),
-           Entry(4, ('multiple heads/headless',)),
-           Entry(5, ('many eyes/one eye',)),
-           Entry(6, ('many limbs/tails',)),
-           Entry(7, ('tentacles/tendrils',)),
-           Entry(8, ('aspect',)),
-           Entry(9, ('element',)),
-           Entry(10, ('magic type',)),
-           Entry(11, ('oddity',)),
-           Entry(12, ('feature','feature'))))
-
-Generator('magic type', d12,
-          (Entry(1, ('divination',)),
-           Entry(3, ('enchantment',)),
-           Entry(5, ('evocation',)),
-           Entry(7, ('illusion',)),
-           Entry(9, ('necromancy',)),
-           Entry(11, ('summoning',))))
-
-Generator('group number', d12,
-          (Entry(1, ('Solitary (1)',)),
-           Entry(5, ('group number (1d6 + 2)',)),
-           Entry(10, ('Horde (4d6 per wave)',))))
-
-Generator('oddity', d12,
-          (Entry(1, ('weird color/smell/sound',)),
-           Entry(2, ('geometric',)),
-           Entry(3, ('web/network/system',)),
-           Entry(4, ('crystalline/glass-like',)),
-           Entry(5, ('fungal',)),
-           Entry(6, ('gaseous/smokey',)),
-           Entry(7, ('mirage/illusion',)),
-           Entry(8, ('volcanic/explosive',)),
-           Entry(9, ('magnetic/repellant',)),
-           Entry(10, ('devoid of life',)),
-           Entry(11, ('unexpectedly alive',)),
-           Entry(12, ('oddity','oddity'))))
-
-Generator('orientation', d12,
-          (Entry(1, ('down/earthward',)),
-           Entry(3, ('north',)),
-           Entry(4, ('northeast',)),
-           Entry(5, ('east',)),
-           Entry(6, ('southeast',)),
-           Entry(7, ('south',)),
-           Entry(8, ('southwest',)),
-           Entry(9, ('west',)),
-           Entry(10, ('northwest',)),
-           Entry(11, ('up/skyward',))))
-
-Generator('ruination', d12,
-          (Entry(1, ('arcane disaster',)),
-           Entry(2, ('damnation/curse',)),
-           Entry(3, ('earthquake/fire/flood',)),
-           Entry(5, ('plague/famine/drought',)),
-           Entry(7, ('overrun by monsters',)),
-           Entry(9, ('war/invasion',)),
-           Entry(11, ('depleted resources',)),
-           Entry(12, ('better prospects elsewhere',))))
-
-Generator('size', d12,
-          (Entry(1, ('Tiny',)),
-           Entry(2, ('Small',)),
-           Entry(4, ('medium-sized',)),
-           Entry(10, ('Large',)),
-           Entry(12, ('Huge',))))
-
-Generator('monster tag', d12,
-          (Entry(1, ('Amorphous',)),
-           Entry(2, ('Cautious',)),
-           Entry(3, ('Construct',)),
-           Entry(4, ('Devious',)),
-           Entry(5, ('Intelligent',)),
-           Entry(6, ('Magical',)),
-           Entry(7, ('Organized',)),
-           Entry(9, ('Planar',)),
-           Entry(10, ('Stealthy',)),
-           Entry(11, ('Terrifying',)),
-           Entry(12, ('monster tag','monster tag'))))
-
-Generator('terrain', d12,
-          (Entry(1, ('wasteland/desert',)),
-           Entry(2, ('flatland/plain',)),
-           Entry(4, ('wetland/marsh/swamp',)),
-           Entry(5, ('woodland/forest/jungle',)),
-           Entry(8, ('highland/hills',)),
-           Entry(10, ('mountains',)),
-           Entry(12, ('oddity',))))
-
-Generator('visibility', d12,
-          (Entry(1, ('buried/camouflaged/nigh invisible',)),
-           Entry(3, ('partly covered/over-grown/hidden',)),
-           Entry(7, ('obvious/in plain sight',)),
-           Entry(10, ('visible at near distance',)),
-           Entry(12, ('visible at great distance/focal point',))))
-
-# CUSTOM -------------------------------------------------------------------------------------------
-
-
-Generator('binding', d12,
-          (Entry(1, ('mask',)),
-           Entry(2, ('bones',)),
-           Entry(3, ('chains/rope/ribbon',)),
-           Entry(4, ('words/names/runes',)),
-           Entry(5, ('ring',)),
-           Entry(6, ('halo/light/shadow',)),
-           Entry(7, ('scar/tatoo',)),
-           Entry(8, ('gem/jewelry',)),
-           Entry(9, ('shared blood/flesh',)),
-           Entry(10, ('key',)),
-           Entry(11, ('silver/gold/mithril',)),
-           Entry(12, ('weapon',))))
-
-def main():
+        _registry_version += 1
+
+# Outcome resolved to its generator by link_generators. Generator names behave as a Link
+# generating with associated generators, GenerateAction as one inheriting the associated flag
+# of the generation.
+Link = collections.namedtuple('Link', ('generator', 'dice', 'repeat', 'inherit_associated'))
+
+# Generators are linked again before the next generation when the registry version changed.
+_registry_version = 0
+_linked_version = -1
+
+def replay(generator_name, log, dice=None, associated=True, max_depth=None, max_nodes=None,
+           require=(), exclude=()):
+    '''Rebuilds the result of Generator.generate(..., record=True) from its roll log.
+
+    The generator name and the options must be those of the recorded generation, and the
+    tables unchanged. Raises ValueError when the log does not match them.'''
+    replayer = RollReplayer(log)
+    result = generators[generator_name].generate(dice, associated, replayer, max_depth,
+                                                 max_nodes, require, exclude)
+    if replayer.position != len(replayer.log):
+        raise ValueError('roll log too long')
+    return result
+
+_PATH_OCCURRENCE = re.compile(r'\[(\d+)\]')
+
+def reroll(result, path, rng=None, associated=True):
+    '''Returns result with the generator node at path generated again, with rng.
+
+    path lists the texts from the root down to the node, joined with '/' or as a tuple, such
+    as 'discovery/evidence/tracks/spoor/creature'. A text followed by [i] selects the i-th of
+    the siblings with that text, results of a repeat included, the first by default. Only the
+    lists from the root down to the node are new: the other nodes are shared with result,
+    which is left unchanged. associated is the flag result was generated with.
+
+    Raises ValueError when path does not lead to a generator node or when result does not
+    match the tables.'''
+    if _linked_version != _registry_version:
+        link_generators()
+    if not isinstance(path, str):
+        path = '/'.join(path)
+    text, occurrence, path = _match_path(path, (result[0],))
+    if occurrence or result[0] not in generators:
+        raise ValueError(text + ': not a generator of the result')
+    # (node, child index, index in the repeat group or None) from the root down to the node.
+    chain = []
+    node = result
+    generator = generators[result[0]]
+    dice = None
+    while path:
+        links = _child_links(generator, node[1:], associated)
+        slots = [(index, group_index, member)
+                 for index, child in enumerate(node[1:], 1)
+                 for group_index, member in (((None, child),) if isinstance(child[0], str)
+                                             else enumerate(child))]
+        text, occurrence, path = _match_path(path, [child[0] for _, _, child in slots])
+        matches = [slot for slot in slots if slot[2][0] == text]
+        if occurrence >= len(matches):
+            raise ValueError('{}[{}]: not in the result'.format(text, occurrence))
+        index, group_index, child = matches[occurrence]
+        link = links[index - 1]
+        if not isinstance(link, Link):
+            raise ValueError(text + ': not a generator of the result')
+        chain.append((node, index, group_index))
+        if not link.inherit_associated:
+            associated = True
+        node = child
+        generator = link.generator
+        dice = link.dice
+    rerolled = generator.generate(dice, associated, rng)
+    for parent, index, group_index in reversed(chain):
+        if group_index is not None:
+            group = list(parent[index])
+            group[group_index] = rerolled
+            rerolled = group
+        parent = list(parent)
+        parent[index] = rerolled
+        rerolled = parent
+    return rerolled
+
+def _match_path(path, texts):
+    '''Returns (text, occurrence, rest of path) of the longest of texts starting path.'''
+    matched = None
+    for text in texts:
+        if (path.startswith(text) and path[len(text):len(text) + 1] in ('', '/', '[')
+                and (matched is None or len(text) > len(matched))):
+            matched = text
+    if matched is None:
+        raise ValueError(path + ': not in the result')
+    rest = path[len(matched):]
+    occurrence = 0
+    match = _PATH_OCCURRENCE.match(rest)
+    if match:
+        occurrence = int(match.group(1))
+        rest = rest[match.end():]
+    if rest and rest[0] != '/':
+        raise ValueError(path + ': not in the result')
+    return matched, occurrence, rest[1:]
+
+def _child_links(generator, children, associated):
+    '''Returns the links that generated children, the children of a node of generator.'''
+    linked_associated = generator._linked_associated if associated else ()
+    for links in generator._links or ((),):
+        links += linked_associated
+        if len(links) == len(children) and all(map(_link_matches, links, children)):
+            return links
+    raise ValueError(generator.name + ': result does not match the tables')
+
+def _link_matches(link, child):
+    if not isinstance(link, Link):
+        return child == [link]
+    if isinstance(child[0], str):
+        return child[0] == link.generator.name
+    return all(member[0] == link.generator.name for member in child)
+
+def _link_outcome(outcome, registry):
+    if isinstance(outcome, GenerateAction):
+        return Link(registry[outcome.generator_name], outcome.dice, outcome.repeat, True)
+    elif outcome in registry:
+        return Link(registry[outcome], None, 1, False)
+    else:
+        return outcome
+
+def _outcomes(generator):
+    for entry in generator.entries or ():
+        yield from entry.outcomes
+    yield from generator.associated_generators or ()
+
+def _outcome_generator_name(outcome):
+    '''Name of the generator called by an outcome, None for a literal text.'''
+    if isinstance(outcome, GenerateAction):
+        return outcome.generator_name
+    return outcome if outcome in generators else None
+
+def link_generators():
+    '''Resolves the outcomes of every generator to direct generator references.
+
+    Raises ValueError if a GenerateAction names a missing generator.'''
+    global _linked_version
+    dangling = [(generator.name, outcome.generator_name)
+                for generator in generators.values()
+                for outcome in _outcomes(generator)
+                if isinstance(outcome, GenerateAction) and outcome.generator_name not in generators]
+    if dangling:
+        raise ValueError('missing generators: ' + ', '.join(
+            '{} (in {})'.format(missing, name) for name, missing in dangling))
+    for generator in generators.values():
+        generator._link()
+    _linked_version = _registry_version
+
+# Generators meant to be called directly, tables unreachable from them are reported by
+# check_generators.
+ROOT_GENERATORS = ('discovery', 'danger', 'dungeon exploration')
+
+GraphReport = collections.namedtuple('GraphReport',
+                                     ('dangling', 'misspelled', 'unreachable', 'cycles'))
+
+def check_generators(roots=ROOT_GENERATORS):
+    '''Checks the generators graph, returns a GraphReport of:
+
+    - dangling: (generator, name) of GenerateAction naming a missing generator.
+    - misspelled: (generator, text, name) of literal texts close to a generator name.
+    - unreachable: generators not reachable from roots.
+    - cycles: tuples of generators that can generate each other.'''
+    import difflib
+    names = list(generators)
+    dangling = []
+    misspelled = []
+    children = {}
+    for generator in generators.values():
+        children[generator.name] = []
+        for outcome in _outcomes(generator):
+            name = _outcome_generator_name(outcome)
+            if name is None:
+                close_names = difflib.get_close_matches(outcome, names, n=1, cutoff=0.9)
+                if close_names:
+                    misspelled.append((generator.name, outcome, close_names[0]))
+            elif name not in generators:
+                dangling.append((generator.name, name))
+            elif name not in children[generator.name]:
+                children[generator.name].append(name)
+    reached = _reached(roots, children)
+    unreachable = [name for name in names if name not in reached]
+    return GraphReport(dangling, misspelled, unreachable, _cycles(names, children))
+
+def _reached(roots, children):
+    '''Names of the generators reachable from roots, children[name] listing the generators
+    name calls.'''
+    reached = set()
+    stack = [root for root in roots if root in generators]
+    while stack:
+        name = stack.pop()
+        if name not in reached:
+            reached.add(name)
+            stack.extend(children[name])
+    return reached
+
+def _cycles(names, children):
+    '''Strongly connected components of more than one node or with a self loop.'''
+    return [tuple(sorted(component, key=names.index))
+            for component in _strongly_connected_components(names, children)
+            if len(component) > 1 or component[0] in children[component[0]]]
+
+def _strongly_connected_components(nodes, children):
+    '''Tarjan's algorithm, components come after the components they lead to.'''
+    indexes = {}
+    lowlinks = {}
+    component_stack = []
+    on_stack = set()
+    components = []
+    for root in nodes:
+        if root in indexes:
+            continue
+        work = [(root, iter(children[root]))]
+        indexes[root] = lowlinks[root] = len(indexes)
+        component_stack.append(root)
+        on_stack.add(root)
+        while work:
+            name, child_names = work[-1]
+            for child in child_names:
+                if child not in indexes:
+                    indexes[child] = lowlinks[child] = len(indexes)
+                    component_stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(children[child])))
+                    break
+                elif child in on_stack:
+                    lowlinks[name] = min(lowlinks[name], indexes[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlinks[parent] = min(lowlinks[parent], lowlinks[name])
+                if lowlinks[name] == indexes[name]:
+                    component = []
+                    while True:
+                        member = component_stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == name:
+                            break
+                    components.append(component)
+    return components
+
+
+Frequency = collections.namedtuple('Frequency', ('key', 'count', 'frequency', 'low', 'high'))
+
+class Analytics:
+    '''Monte Carlo frequencies of the results of a generator, sampled with generate_many.
+
+    Counts, for each sampled result, the presence of every generator, leaf ((generator name,
+    text) of literal texts) and path (generator names down to a literal text), and the entries
+    selected. Memory only depends on the number of distinct keys, not on the samples.'''
+
+    KINDS = ('generator', 'leaf', 'path')
+
+    def __init__(self, generator_name):
+        self.generator = generators[generator_name]
+        self.n_samples = 0
+        self.counts = {kind: collections.Counter() for kind in self.KINDS}
+        self.entry_counts = collections.Counter()
+
+    def sample(self, n, seed=None, batch_size=10000):
+        '''Samples n more results by batches of batch_size.'''
+        contexts = GenerationContext(seed).spawn((n + batch_size - 1) // batch_size)
+        for context, start in zip(contexts, range(0, n, batch_size)):
+            batch_seed = context.random.getrandbits(128)
+            try:
+                rng = _import_numpy().random.default_rng(batch_seed)
+            except ImportError as error:
+                raise ImportError('Analytics requires numpy') from error
+            if _linked_version != _registry_version:
+                link_generators()
+            results = self.generator._generate_many(min(batch_size, n - start), rng,
+                                                    entry_counts=self.entry_counts)
+            for generated_texts in results:
+                self._count(generated_texts)
+            self.n_samples += len(results)
+
+    def _count(self, generated_texts):
+        found = {kind: set() for kind in self.KINDS}
+        stack = [(generated_texts, ())]
+        while stack:
+            node, path = stack.pop()
+            if not isinstance(node[0], str):
+                stack.extend((child, path) for child in node)
+            elif node[0] in generators:
+                found['generator'].add(node[0])
+                stack.extend((child, path + (node[0],)) for child in node[1:])
+            else:
+                found['leaf'].add((path[-1], node[0]))
+                found['path'].add(path + (node[0],))
+        for kind, keys in found.items():
+            self.counts[kind].update(keys)
+
+    def frequencies(self, kind='leaf', confidence=0.95):
+        '''Returns the Frequency of each key of a kind, by decreasing count.
+
+        low and high bound the Wilson score interval at the confidence level.'''
+        import statistics
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        n = self.n_samples
+        frequencies = []
+        for key, count in self.counts[kind].most_common():
+            p = count / n
+            center = (p + z * z / (2 * n)) / (1 + z * z / n)
+            margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+            frequencies.append(Frequency(key, count, p, max(0.0, center - margin),
+                                         min(1.0, center + margin)))
+        return frequencies
+
+    def unreached_entries(self):
+        '''Returns (generator name, entry) of the entries reachable from the sampled generator
+        that were never selected.'''
+        children = {generator.name: [name for name in map(_outcome_generator_name,
+                                                          _outcomes(generator))
+                                     if name in generators]
+                    for generator in generators.values()}
+        reached = _reached((self.generator.name,), children)
+        unreached = []
+        for name, generator in generators.items():
+            if name not in reached:
+                continue
+            for index, entry in enumerate(generator.entries or ()):
+                if not self.entry_counts[name, index]:
+                    unreached.append((name, entry))
+        return unreached
+
+class ExpectationModel:
+    '''Exact expectations over the results of the generators, computed without sampling.
+
+    The tables form a probabilistic grammar whose states are generator calls (generator, dice,
+    associated). Values are solved state by state, dependencies first, and by fixed-point
+    iteration within recursive tables such as monster tag, up to tolerance. Sizes count the
+    nodes of a result (generators and texts) as Resolver.max_nodes does, depths as max_depth.'''
+
+    def __init__(self, tolerance=1e-12, max_iterations=100000):
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self._version = None
+        self._roots = set()
+
+    def _build(self):
+        if self._version == _registry_version:
+            return
+        if _linked_version != _registry_version:
+            link_generators()
+        # Each call is (entries, associated), entries being (probability, children) pairs and
+        # children texts or (call, copies) with copies a tuple of (count, probability).
+        self._calls = {}
+        self._roots = {key for key in self._roots if generators.get(key[0].name) is key[0]}
+        pending = [self._call_key(generator, None, True) for generator in generators.values()]
+        pending.extend(self._roots)
+        while pending:
+            key = pending.pop()
+            if key in self._calls:
+                continue
+            generator, dice, associated = key
+            entries = tuple((float(probability), self._children(links, associated, pending))
+                            for (_, probability), links
+                            in zip(generator.entry_probabilities(dice), generator._links)
+                            if probability)
+            associated_children = ()
+            if associated:
+                associated_children = self._children(generator._linked_associated, associated,
+                                                      pending)
+            self._calls[key] = (entries, associated_children)
+        children = {key: [child[0] for _, entry_children in entries + ((1, associated),)
+                          for child in entry_children if not isinstance(child, str)]
+                    for key, (entries, associated) in self._calls.items()}
+        self._components = [(component, len(component) > 1
+                             or component[0] in children[component[0]])
+                            for component in _strongly_connected_components(list(self._calls),
+                                                                            children)]
+        self._expected_nodes = None
+        self._expected_depths = None
+        self._reach_probabilities = None
+        self._absences = {}
+        self._covers = {}
+        self._version = _registry_version
+
+    @staticmethod
+    def _call_key(generator, dice, associated):
+        return (generator, dice or generator.dice, associated)
+
+    def _call(self, generator_name, dice, associated):
+        '''Returns the key of a call, adding it to the model when its dice are not the default.'''
+        self._build()
+        key = self._call_key(generators[generator_name], dice, associated)
+        if key not in self._calls:
+            self._roots.add(key)
+            self._version = None
+            self._build()
+        return key
+
+    def _children(self, links, associated, pending):
+        children = []
+        for link in links:
+            if not isinstance(link, Link):
+                children.append(link)
+                continue
+            key = self._call_key(link.generator, link.dice,
+                                 associated if link.inherit_associated else True)
+            pending.append(key)
+            if isinstance(link.repeat, int):
+                copies = ((max(link.repeat, 1), 1.0),)
+            else:
+                copies = tuple((max(repeat, 1), float(probability))
+                               for repeat, probability in link.repeat.distribution().items())
+            children.append((key, copies))
+        return tuple(children)
+
+    def _solve(self, update, initial):
+        '''Returns the values of every call, update(key, values) computing a call value.'''
+        values = {}
+        for component, recursive in self._components:
+            for key in component:
+                values[key] = initial
+            for _ in range(self.max_iterations if recursive else 1):
+                change = 0.0
+                for key in component:
+                    value = update(key, values)
+                    change = max(change, self._change(values[key], value))
+                    values[key] = value
+                if change <= self.tolerance:
+                    break
+            else:
+                if recursive:
+                    raise ValueError('no convergence for {}, results may be infinite'.format(
+                        ', '.join(sorted({key[0].name for key in component}))))
+        return values
+
+    @staticmethod
+    def _change(old, new):
+        if isinstance(new, dict):
+            return max((abs(new[key] - old.get(key, 1.0)) for key in new), default=0.0)
+        return abs(new - old) / max(1.0, abs(new))
+
+    def _nodes_update(self, key, values):
+        def nodes(child):
+            if isinstance(child, str):
+                return 1.0
+            child_key, copies = child
+            return sum(count * probability for count, probability in copies) * values[child_key]
+        entries, associated = self._calls[key]
+        return (1.0 + sum(probability * sum(map(nodes, children))
+                          for probability, children in entries)
+                + sum(map(nodes, associated)))
+
+    def _reach_update(self, key, values):
+        # Probability that a (generator name, text) leaf is absent, 1 for the missing keys.
+        generator = key[0]
+
+        def absent(child):
+            if isinstance(child, str):
+                return {(generator.name, child): 0.0}
+            child_key, copies = child
+            return {leaf: sum(probability * value ** count for count, probability in copies)
+                    for leaf, value in values[child_key].items()}
+
+        def product(children):
+            absences = {}
+            for child in children:
+                for leaf, value in absent(child).items():
+                    absences[leaf] = absences.get(leaf, 1.0) * value
+            return absences
+
+        entries, associated = self._calls[key]
+        entry_absences = [(probability, product(children)) for probability, children in entries]
+        leaves = set().union(*(absences for _, absences in entry_absences))
+        absences = {leaf: sum(probability * absences.get(leaf, 1.0)
+                              for probability, absences in entry_absences)
+                    for leaf in leaves}
+        for leaf, value in product(associated).items():
+            absences[leaf] = absences.get(leaf, 1.0) * value
+        return absences
+
+    def _depths(self):
+        '''Expected heights, summing P(height > h) until it falls under tolerance.'''
+        # at_most[key] is P(height <= h) of each call, starting at h = 0.
+        at_most = {key: 0.0 for key in self._calls}
+        expected = {key: 0.0 for key in self._calls}
+        for _ in range(self.max_iterations):
+            tail = 0.0
+            for key, value in at_most.items():
+                expected[key] += 1.0 - value
+                tail = max(tail, 1.0 - value)
+            if tail <= self.tolerance:
+                return expected
+
+            def below(child):
+                if isinstance(child, str):
+                    return 1.0
+                child_key, copies = child
+                return sum(probability * at_most[child_key] ** count
+                           for count, probability in copies)
+
+            at_most = {key: (sum(probability * math.prod(map(below, children))
+                                 for probability, children in entries)
+                             + (0.0 if entries else 1.0)) * math.prod(map(below, associated))
+                       for key, (entries, associated) in self._calls.items()}
+        raise ValueError('no convergence of the depths, results may be infinite')
+
+    def expected_nodes(self, generator_name, dice=None, associated=True):
+        '''Expected number of nodes of a result of a generator.'''
+        key = self._call(generator_name, dice, associated)
+        if self._expected_nodes is None:
+            self._expected_nodes = self._solve(self._nodes_update, 0.0)
+        return self._expected_nodes[key]
+
+    def expected_depth(self, generator_name, dice=None, associated=True):
+        '''Expected depth of a result of a generator, a lone root having depth 1.'''
+        key = self._call(generator_name, dice, associated)
+        if self._expected_depths is None:
+            self._expected_depths = self._depths()
+        return self._expected_depths[key]
+
+    def reach_probabilities(self, generator_name, dice=None, associated=True):
+        '''Probability that a result of a generator contains each (generator name, text) leaf.'''
+        key = self._call(generator_name, dice, associated)
+        if self._reach_probabilities is None:
+            self._reach_probabilities = self._solve(self._reach_update, {})
+        return {leaf: 1.0 - absence for leaf, absence in self._reach_probabilities[key].items()}
+
+    def absence_probability(self, generator_name, texts, dice=None, associated=True):
+        '''Probability that no node of a result of a generator has one of texts.'''
+        key = self._call(generator_name, dice, associated)
+        return self._absence(key, frozenset(texts))
+
+    def _absence(self, key, texts):
+        if texts not in self._absences:
+            def update(key, values):
+                if key[0].name in texts:
+                    return 0.0
+                entries, associated = self._calls[key]
+                absence = sum(probability * math.prod(self._unit_absence(child, texts, values)
+                                                      for child in children)
+                              for probability, children in entries) if entries else 1.0
+                return absence * math.prod(self._unit_absence(child, texts, values)
+                                           for child in associated)
+            self._absences[texts] = self._solve(update, 1.0)
+        return self._absences[texts][key]
+
+    def _unit_absence(self, child, texts, values=None):
+        if isinstance(child, str):
+            return 0.0 if child in texts else 1.0
+        child_key, copies = child
+        absence = values[child_key] if values is not None else self._absence(child_key, texts)
+        return sum(probability * absence ** count for count, probability in copies)
+
+    def _cover(self, units, required, excluded):
+        '''Probability that units have every required text and none of excluded.'''
+        if not required and not excluded:
+            return 1.0
+        cover_key = (units, required, excluded)
+        if cover_key not in self._covers:
+            self._covers[cover_key] = max(
+                0.0, sum((-1) ** len(subset)
+                         * math.prod(self._unit_absence(unit, excluded.union(subset))
+                                     for unit in units)
+                         for subset in _subsets(required)))
+        return self._covers[cover_key]
+
+    def _split(self, units, required, excluded, rng):
+        '''Draws the (required, excluded) constraints of each unit so that units sampled under
+        them follow the distribution of units conditioned on covering required without any of
+        excluded. Each required text is assigned to the first unit having it.'''
+        if not required:
+            return [(required, excluded)] * len(units)
+        constraints = []
+        for i, unit in enumerate(units):
+            subsets = _subsets(required)
+            weights = [self._cover((unit,), subset, excluded | (required - subset))
+                       * self._cover(units[i + 1:], required - subset, excluded)
+                       for subset in subsets]
+            subset = subsets[_choose(weights, rng)]
+            constraints.append((subset, excluded | (required - subset)))
+            required = required - subset
+        return constraints
+
+    def sample(self, generator_name, require=(), exclude=(), dice=None, associated=True,
+               rng=None):
+        '''Generates a result of a generator conditioned on having a node for every text of
+        require and none for the texts of exclude, in the format of Generator.generate().
+
+        Entries, repeats and children are drawn from the conditioned distribution directly, so
+        the cost does not depend on the probability of the constraints. Parts left without
+        constraints are generated by a Resolver. Raises ValueError when no result can satisfy
+        them.'''
+        key = self._call(generator_name, dice, associated)
+        require = frozenset(require)
+        exclude = frozenset(exclude)
+        if self._cover(((key, ((1, 1.0),)),), require, exclude) <= 0.0:
+            raise ValueError('no result of {} satisfies the constraints'.format(generator_name))
+        resolver = Resolver(rng=rng)
+        root = []
+        # Tasks are (unit, required, excluded, parent), units being texts or (call, copies).
+        stack = [((key, ((1, 1.0),)), require, exclude, root)]
+        while stack:
+            unit, required, excluded, parent = stack.pop()
+            if isinstance(unit, str):
+                parent.append([unit])
+                continue
+            key, copies = unit
+            if not required and not excluded:
+                count = copies[_choose([probability for _, probability in copies], rng)][0]
+                results = [resolver.generate(*key) for _ in range(count)]
+                parent.append(results if count > 1 else results[0])
+                continue
+            weights = [probability * self._cover(((key, ((1, 1.0),)),) * count, required,
+                                                 excluded)
+                       for count, probability in copies]
+            count = copies[_choose(weights, rng)][0]
+            if count > 1:
+                group = []
+                parent.append(group)
+                units = ((key, ((1, 1.0),)),) * count
+                stack.extend((unit, unit_required, unit_excluded, group)
+                             for unit, (unit_required, unit_excluded)
+                             in reversed(list(zip(units, self._split(units, required,
+                                                                     excluded, rng)))))
+                continue
+            node = [key[0].name]
+            parent.append(node)
+            required = required - {key[0].name}
+            entries, associated_units = self._calls[key]
+            if entries:
+                weights = [probability * self._cover(children + associated_units, required,
+                                                     excluded)
+                           for probability, children in entries]
+                units = entries[_choose(weights, rng)][1] + associated_units
+            else:
+                units = associated_units
+            stack.extend((unit, unit_required, unit_excluded, node)
+                         for unit, (unit_required, unit_excluded)
+                         in reversed(list(zip(units, self._split(units, required, excluded,
+                                                                 rng)))))
+        return root[0]
+
+def _subsets(texts):
+    '''Every subset of a frozenset of texts, as frozensets.'''
+    texts = sorted(texts)
+    return [frozenset(combination) for size in range(len(texts) + 1)
+            for combination in itertools.combinations(texts, size)]
+
+# Resolution of the uniform draws of _choose.
+_CHOICE_RESOLUTION = 2 ** 53
+
+def _choose(weights, rng=None):
+    '''Index drawn with probability proportional to weights, with rng as in Die.roll.'''
+    possible = [index for index, weight in enumerate(weights) if weight]
+    if len(possible) == 1:
+        return possible[0]
+    # Drawn with randint as the dice, so that RollRecorder records it.
+    threshold = ((rng or random).randint(0, _CHOICE_RESOLUTION - 1) / _CHOICE_RESOLUTION
+                 * sum(weights))
+    index = bisect.bisect_right(list(itertools.accumulate(weights)), threshold)
+    # Rounding can put the threshold at the total, fall back on the last possible index.
+    while index >= len(weights) or not weights[index]:
+        index -= 1
+    return index
+
+# Model shared by the constrained generations.
+expectation_model = ExpectationModel()
+
+class StringTable:
+    '''Interns strings as integer ids.'''
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def intern(self, string):
+        try:
+            return self.ids[string]
+        except KeyError:
+            self.ids[string] = len(self.strings)
+            self.strings.append(string)
+            return self.ids[string]
+
+# String table shared by default by all ResultTree.
+result_strings = StringTable()
+
+class ResultTree:
+    '''Compact result stored in flat arrays instead of nested lists.
+
+    Nodes are indexed in depth-first order, the root being 0. Each node has a parent, a first
+    child and a next sibling index (-1 when there is none) and the id of its text in strings,
+    or GROUP for the lists of results of a repeated GenerateAction.'''
+
+    GROUP = -1
+
+    __slots__ = ('strings', 'text_ids', 'parents', 'first_children', 'next_siblings')
+
+    def __init__(self, strings=None):
+        self.strings = strings if strings is not None else result_strings
+        self.text_ids = array.array('i')
+        self.parents = array.array('i')
+        self.first_children = array.array('i')
+        self.next_siblings = array.array('i')
+
+    def __len__(self):
+        return len(self.text_ids)
+
+    @classmethod
+    def from_lists(cls, generated_texts, strings=None):
+        '''Converts a result in the nested lists format returned by Generator.generate().'''
+        tree = cls(strings)
+        intern = tree.strings.intern
+        last_children = []
+        stack = [(generated_texts, -1)]
+        while stack:
+            generated_texts, parent = stack.pop()
+            if generated_texts and isinstance(generated_texts[0], str):
+                text_id = intern(generated_texts[0])
+                children = generated_texts[1:]
+            else:
+                text_id = cls.GROUP
+                children = generated_texts
+            index = len(tree.text_ids)
+            tree.text_ids.append(text_id)
+            tree.parents.append(parent)
+            tree.first_children.append(-1)
+            tree.next_siblings.append(-1)
+            last_children.append(-1)
+            if parent >= 0:
+                if last_children[parent] < 0:
+                    tree.first_children[parent] = index
+                else:
+                    tree.next_siblings[last_children[parent]] = index
+                last_children[parent] = index
+            stack.extend((child, index) for child in reversed(children))
+        return tree
+
+    def to_lists(self):
+        '''Converts back to the nested lists format returned by Generator.generate().'''
+        strings = self.strings.strings
+        nodes = [[] if text_id == self.GROUP else [strings[text_id]]
+                 for text_id in self.text_ids]
+        for index in range(1, len(nodes)):
+            nodes[self.parents[index]].append(nodes[index])
+        return nodes[0]
+
+    def text(self, index):
+        '''Text of a node, None for a group.'''
+        text_id = self.text_ids[index]
+        return None if text_id == self.GROUP else self.strings.strings[text_id]
+
+    def children(self, index):
+        child = self.first_children[index]
+        while child >= 0:
+            yield child
+            child = self.next_siblings[child]
+
+def _result_nodes(result):
+    '''Returns (root, text, children) to walk a nested lists result or a ResultTree alike.'''
+    if isinstance(result, ResultTree):
+        return 0, result.text, result.children
+    return result, _list_text, _list_children
+
+def _list_text(node):
+    return node[0] if isinstance(node[0], str) else None
+
+def _list_children(node):
+    return node[1:] if isinstance(node[0], str) else node
+
+def render_tree(result, indent='', is_last=True):
+    '''Renders a result as a box-drawing tree, one line per node.'''
+    root, text, children = _result_nodes(result)
+    lines = []
+    stack = [(root, indent, is_last)]
+    while stack:
+        node, indent, is_last = stack.pop()
+        node_name = text(node)
+        node_children = list(children(node))
+        if node_name is not None:
+            if is_last:
+                lines.append(indent + ' └─' + node_name + '\n')
+                indent += '   '
+            else:
+                lines.append(indent + ' ├─' + node_name + '\n')
+                indent += ' │ '
+            last = len(node_children) - 1
+            stack.extend((node_children[i], indent, i == last) for i in range(last, -1, -1))
+        else:
+            # Results of a repeated GenerateAction are never drawn as last children.
+            stack.extend((child, indent, False) for child in reversed(node_children))
+    return ''.join(lines)
+
+def render_markdown(result):
+    '''Renders a result as a markdown nested list.'''
+    root, text, children = _result_nodes(result)
+    lines = []
+    stack = [(root, '')]
+    while stack:
+        node, indent = stack.pop()
+        node_name = text(node)
+        if node_name is not None:
+            lines.append(indent + '- ' + node_name + '\n')
+            stack.extend((child, indent + '  ') for child in reversed(list(children(node))))
+        else:
+            stack.extend((child, indent) for child in reversed(list(children(node))))
+    return ''.join(lines)
+
+def _render_json(result):
+    if isinstance(result, ResultTree):
+        result = result.to_lists()
+    return json.dumps(result)
+
+def render_csv(result):
+    '''Renders a result as node,parent,text csv rows, the root being node 0 with parent -1.
+
+    Nodes are numbered in depth-first order as in ResultTree, groups have an empty text.'''
+    if not isinstance(result, ResultTree):
+        result = ResultTree.from_lists(result)
+    output = io.StringIO()
+    import csv
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerows((node, result.parents[node], result.text(node) or '')
+                     for node in range(len(result)))
+    return output.getvalue()
+
+class Renderer:
+    '''Renders results in one of FORMATS, to a string or to a text stream.
+
+    render_many renders results by batches of buffer_size and writes each batch at once.'''
+
+    FORMATS = ('tree', 'json', 'ndjson', 'markdown', 'csv')
+
+    # (render, header, separator, footer) of each format.
+    _DOCUMENTS = {'tree': (render_tree, '', '', ''),
+                  'json': (_render_json, '[', ',\n', ']\n'),
+                  'ndjson': (lambda result: _render_json(result) + '\n', '', '', ''),
+                  'markdown': (render_markdown, '', '\n', ''),
+                  'csv': (render_csv, 'node,parent,text\n', '', '')}
+
+    def __init__(self, output_format='tree', buffer_size=1024):
+        if output_format not in self.FORMATS:
+            raise ValueError(output_format + ': unknown format')
+        self.output_format = output_format
+        self.buffer_size = buffer_size
+        self._render, self.header, self.separator, self.footer = self._DOCUMENTS[output_format]
+
+    def render(self, result):
+        '''Renders a single result.'''
+        if self.output_format == 'json':
+            return self._render(result) + '\n'
+        return self._render(result)
+
+    def render_body(self, results):
+        '''Renders results without the document header and footer, see write_document.'''
+        return self.separator.join(self._render(result) for result in results)
+
+    def render_many(self, results, stream=None):
+        '''Renders results as one document, returns it as a string if stream is None.'''
+        output = io.StringIO() if stream is None else stream
+        results = iter(results)
+        bodies = iter(lambda: self.render_body(itertools.islice(results, self.buffer_size)), '')
+        self.write_document(bodies, output)
+        if stream is None:
+            return output.getvalue()
+
+    def write_document(self, bodies, stream):
+        '''Writes bodies returned by render_body as one document, empty bodies being skipped.'''
+        stream.write(self.header)
+        written = False
+        for body in bodies:
+            if not body:
+                continue
+            if written:
+                stream.write(self.separator)
+            stream.write(body)
+            written = True
+        stream.write(self.footer)
+
+# Leaf text replacing the parts of a result cut by a Resolver budget.
+TRUNCATED = '(truncated)'
+
+class GeneratorStats:
+    '''Statistics of a generator, see Instrumentation.'''
+
+    __slots__ = ('calls', 'cumulative_time', 'self_time', 'children', 'fan_outs', 'depths')
+
+    def __init__(self):
+        self.calls = 0
+        self.cumulative_time = 0.0
+        self.self_time = 0.0
+        self.children = 0
+        self.fan_outs = collections.Counter()
+        self.depths = collections.Counter()
+
+class Instrumentation:
+    '''Per generator statistics of the generations made while instrumentation is enabled.
+
+    stats maps generator names to GeneratorStats: calls, cumulative and self time in seconds,
+    children produced, and histograms of the fan-out (children of a call) and of the depth
+    reached (height of the subtree of a call). The cumulative time of recursive generators
+    counts every level.'''
+
+    def __init__(self):
+        self.stats = collections.defaultdict(GeneratorStats)
+
+    def _open(self, generator, frames):
+        frames.append([self.stats[generator.name], time.perf_counter(), 0.0, 0])
+
+    def _close(self, frames, node):
+        stats, start, children_time, height = frames.pop()
+        elapsed = time.perf_counter() - start
+        fan_out = sum(1 if isinstance(child[0], str) else len(child) for child in node[1:])
+        height += 1
+        stats.calls += 1
+        stats.cumulative_time += elapsed
+        stats.self_time += elapsed - children_time
+        stats.children += fan_out
+        stats.fan_outs[fan_out] += 1
+        stats.depths[height] += 1
+        if frames:
+            parent_frame = frames[-1]
+            parent_frame[2] += elapsed
+            parent_frame[3] = max(parent_frame[3], height)
+
+    def format(self):
+        '''Returns the stats as a text table, by decreasing cumulative time.'''
+        lines = ['{:<32} {:>9} {:>12} {:>12} {:>9} {:>9}'.format(
+            'generator', 'calls', 'cumulative', 'self', 'fan-out', 'depth')]
+        for name, stats in sorted(self.stats.items(),
+                                  key=lambda item: item[1].cumulative_time, reverse=True):
+            lines.append('{:<32} {:>9} {:>12.6f} {:>12.6f} {:>9.2f} {:>9}'.format(
+                name, stats.calls, stats.cumulative_time, stats.self_time,
+                stats.children / stats.calls, max(stats.depths)))
+        return '\n'.join(lines)
+
+# Instrumentation recording the generations, None when disabled.
+instrumentation = None
+
+def enable_instrumentation():
+    '''Starts recording generator statistics, returns the Instrumentation.'''
+    global instrumentation
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    return instrumentation
+
+def disable_instrumentation():
+    global instrumentation
+    instrumentation = None
+
+# Generator of the task closing an instrumented generator call in the Resolver work stack.
+_CLOSE = object()
+
+class Resolver:
+    '''Generates results with an explicit work stack instead of recursion.
+
+    max_depth bounds the nesting of generators under the root (depth 0) and max_nodes the
+    number of nodes of a result. Parts cut by a budget are replaced by a [TRUNCATED] leaf and
+    truncated is set. Without budgets, results are the same as a recursive generation.'''
+
+    def __init__(self, max_depth=None, max_nodes=None, rng=None):
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.rng = rng
+        self.truncated = False
+
+    def generate(self, generator, dice=None, associated=True):
+        rng = self.rng
+        max_depth = self.max_depth
+        max_nodes = self.max_nodes
+        self.truncated = False
+        if _linked_version != _registry_version:
+            link_generators()
+        recorder = instrumentation
+        frames = []
+        n_nodes = 0
+        root = []
+        # Tasks are (generator, dice, associated, parent, depth) for a generator to roll, or
+        # (None, link, associated, parent, depth) for a linked outcome to resolve. Children
+        # are pushed in reverse so that tasks run, and roll dice, in depth-first order.
+        stack = [(generator, dice, associated, root, 0)]
+        while stack:
+            generator, value, associated, parent, depth = stack.pop()
+            if generator is None:
+                if isinstance(value, Link):
+                    if not value.inherit_associated:
+                        associated = True
+                    repeat = value.repeat
+                    if not isinstance(repeat, int):
+                        repeat = repeat.roll(rng)
+                    if repeat > 1:
+                        group = []
+                        parent.append(group)
+                        stack.extend([(value.generator, value.dice, associated, group, depth)]
+                                     * repeat)
+                    else:
+                        stack.append((value.generator, value.dice, associated, parent, depth))
+                    continue
+                node = [value]
+            elif generator is _CLOSE:
+                recorder._close(frames, parent)
+                continue
+            elif max_depth is not None and depth > max_depth:
+                self.truncated = True
+                parent.append([TRUNCATED])
+                continue
+            else:
+                node = [generator.name]
+            n_nodes += 1
+            if max_nodes is not None and n_nodes > max_nodes:
+                self._truncate(parent, stack)
+                break
+            parent.append(node)
+            if generator is None:
+                continue
+            if recorder is not None:
+                recorder._open(generator, frames)
+                stack.append((_CLOSE, None, None, node, None))
+            to_resolve = []
+            if generator.entries:
+                result = generator.dice.roll(rng) if not value else value.roll(rng)
+                links = generator._select_links(result)
+                if generator._is_leaf and (max_nodes is None
+                                           or n_nodes + len(links) <= max_nodes):
+                    node.extend([text] for text in links)
+                    n_nodes += len(links)
+                    if recorder is not None:
+                        stack.pop()
+                        recorder._close(frames, node)
+                    continue
+                to_resolve.extend(links)
+            if associated:
+                to_resolve.extend(generator._linked_associated)
+            depth += 1
+            for link in reversed(to_resolve):
+                # Links without repeat roll nothing when resolved, they are pushed as generators.
+                if isinstance(link, Link) and link.repeat == 1:
+                    stack.append((link.generator, link.dice,
+                                  associated if link.inherit_associated else True, node, depth))
+                else:
+                    stack.append((None, link, associated, node, depth))
+        return root[0]
+
+    def _truncate(self, parent, stack):
+        self.truncated = True
+        parent.append([TRUNCATED])
+        # Repeat groups left empty would not be valid nodes.
+        for _, _, _, pending_parent, _ in stack:
+            if not pending_parent:
+                pending_parent.append([TRUNCATED])
+
+# Layout of the compiled tables files written by write_compiled_tables: a header then int32
+# (generators, lookups, min_results, entries, links, dice, string_offsets), int64 (roll_tables)
+# and bytes (string_data) sections, in native byte order.
+COMPILED_TABLES_MAGIC = b'PGCT'
+COMPILED_TABLES_VERSION = 2
+_COMPILED_SECTIONS = (('generators', 'i'), ('lookups', 'i'), ('min_results', 'i'),
+                      ('entries', 'i'), ('links', 'i'), ('dice', 'i'), ('string_offsets', 'i'),
+                      ('roll_tables', 'q'), ('string_data', 'B'))
+_COMPILED_HEADER = struct.Struct('4sII' + 'Q' * len(_COMPILED_SECTIONS))
+# Fields of the records of the generators, links and dice sections.
+_GENERATOR_FIELDS = 10
+_LINK_FIELDS = 6
+_DICE_FIELDS = 5
+# Kinds of dice records.
+_DIE_ROLL, _TABLE_ROLL, _CONSTANT_ROLL, _SUM_ROLL = range(4)
+
+def write_compiled_tables(path):
+    '''Writes the registered generators to a compiled tables file, see CompiledTables.
+
+    Generators are records of (name, dice, entries count, first entry, min results sorted,
+    lookup offset, lookup length, first lookup, first associated link, associated count).
+    Entries are (first link, links count) and links (text or generator, text id or generator
+    index, dice, repeat dice, repeat, inherit associated), -1 standing for no dice.'''
+    if _linked_version != _registry_version:
+        link_generators()
+    sections = {name: array.array(typecode) for name, typecode in _COMPILED_SECTIONS}
+    strings = StringTable()
+    indexes = {id(generator): index for index, generator in enumerate(generators.values())}
+    dice_ids = {}
+
+    def dice_id(dice):
+        if dice is None:
+            return -1
+        if id(dice) not in dice_ids:
+            dice_ids[id(dice)] = len(dice_ids)
+            if isinstance(dice, Die) and dice.n == 1:
+                record = (_DIE_ROLL, dice.value, 0, 0, 0)
+            elif isinstance(dice, Dice) and dice._single_die is not None:
+                record = (_DIE_ROLL, dice._single_die.value, dice.bonus, 0, 0)
+            elif isinstance(dice, Dice) and not dice.dice_list:
+                record = (_CONSTANT_ROLL, 0, dice.bonus, 0, 0)
+            elif dice.single_draw:
+                results, cumulative, total = dice.roll_table()
+                record = (_TABLE_ROLL, 0, 0, len(sections['roll_tables']), len(results))
+                sections['roll_tables'].extend(results)
+                sections['roll_tables'].extend(cumulative)
+            else:
+                # The (value, n) faces, summed die roll by die roll as Dice.roll does.
+                record = (_SUM_ROLL, 0, getattr(dice, 'bonus', 0), len(sections['roll_tables']),
+                          len(dice.faces))
+                for face in dice.faces:
+                    sections['roll_tables'].extend(face)
+            sections['dice'].extend(record)
+        return dice_ids[id(dice)]
+
+    def add_links(links):
+        start = len(sections['links']) // _LINK_FIELDS
+        for link in links:
+            if isinstance(link, Link):
+                repeat_dice = -1 if isinstance(link.repeat, int) else dice_id(link.repeat)
+                sections['links'].extend((1, indexes[id(link.generator)], dice_id(link.dice),
+                                          repeat_dice, link.repeat if repeat_dice < 0 else 0,
+                                          link.inherit_associated))
+            else:
+                sections['links'].extend((0, strings.intern(link), -1, -1, 0, 0))
+        return start, len(links)
+
+    for generator in generators.values():
+        entries_start = len(sections['entries']) // 2
+        for links in generator._links:
+            sections['entries'].extend(add_links(links))
+        sections['min_results'].extend(entry.min_result for entry in generator.entries or ())
+        lookup_start = len(sections['lookups'])
+        if generator._lookup_indexes is not None:
+            sections['lookups'].extend(generator._lookup_indexes)
+        associated_start, associated_count = add_links(generator._linked_associated)
+        sections['generators'].extend((
+            strings.intern(generator.name), dice_id(generator.dice),
+            len(generator.entries or ()), entries_start, generator._min_results is not None,
+            generator._lookup_offset, len(generator._lookup_indexes or ()), lookup_start,
+            associated_start, associated_count))
+    offset = 0
+    for string in strings.strings:
+        sections['string_offsets'].append(offset)
+        encoded = string.encode('utf-8')
+        sections['string_data'].extend(encoded)
+        offset += len(encoded)
+    sections['string_offsets'].append(offset)
+    temporary_path = path + '.' + str(os.getpid())
+    with open(temporary_path, 'wb') as file:
+        file.write(_COMPILED_HEADER.pack(COMPILED_TABLES_MAGIC, COMPILED_TABLES_VERSION,
+                                         len(generators),
+                                         *(len(sections[name]) for name, _ in _COMPILED_SECTIONS)))
+        for name, _ in _COMPILED_SECTIONS:
+            # Sections start on 8 bytes boundaries so that they can be cast in place.
+            file.write(b'\0' * (-file.tell() % 8))
+            sections[name].tofile(file)
+    os.replace(temporary_path, path)
+
+class CompiledTables:
+    '''Read-only generators mapped from a compiled tables file.
+
+    The file is memory mapped and generation reads its records in place, so processes mapping
+    the same file share a single copy of the tables. Texts are decoded when first produced.
+    generate() rolls the dice in the same order as Generator.generate() and returns the same
+    results for the same rng.'''
+
+    def __init__(self, path):
+        import mmap
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_generators, *lengths = _COMPILED_HEADER.unpack_from(self._mmap)
+        if magic != COMPILED_TABLES_MAGIC or version != COMPILED_TABLES_VERSION:
+            raise ValueError(path + ': not a compiled tables file of this version')
+        view = memoryview(self._mmap)
+        offset = _COMPILED_HEADER.size
+        for (name, typecode), length in zip(_COMPILED_SECTIONS, lengths):
+            offset += -offset % 8
+            size = length * array.array(typecode).itemsize
+            setattr(self, '_' + name, view[offset:offset + size].cast(typecode))
+            offset += size
+        self._texts = {}
+        self.names = {self._text(self._generators[index * _GENERATOR_FIELDS]): index
+                      for index in range(n_generators)}
+
+    def close(self):
+        for name, _ in _COMPILED_SECTIONS:
+            getattr(self, '_' + name).release()
+        self._mmap.close()
+
+    def _text(self, text_id):
+        try:
+            return self._texts[text_id]
+        except KeyError:
+            start, stop = self._string_offsets[text_id], self._string_offsets[text_id + 1]
+            text = self._texts[text_id] = bytes(self._string_data[start:stop]).decode('utf-8')
+            return text
+
+    def _roll(self, dice, rng):
+        dice_section = self._dice
+        dice *= _DICE_FIELDS
+        kind = dice_section[dice]
+        if kind == _DIE_ROLL:
+            return (rng or random).randint(1, dice_section[dice + 1]) + dice_section[dice + 2]
+        elif kind == _CONSTANT_ROLL:
+            return dice_section[dice + 2]
+        start = dice_section[dice + 3]
+        length = dice_section[dice + 4]
+        tables = self._roll_tables
+        if kind == _SUM_ROLL:
+            faces = tables[start:start + 2 * length]
+            return _roll_summed(zip(faces[::2], faces[1::2]), dice_section[dice + 2], rng)
+        cumulative = tables[start + length:start + 2 * length]
+        return tables[start + bisect.bisect_right(cumulative,
+                                                  (rng or random).randint(0, cumulative[-1] - 1))]
+
+    def _entry_index(self, record, result):
+        '''Index of the entry selected by a roll of the generator record starting at record.'''
+        generators_section = self._generators
+        index = result - generators_section[record + 5]
+        if 0 <= index < generators_section[record + 6]:
+            return self._lookups[generators_section[record + 7] + index]
+        n_entries = generators_section[record + 2]
+        entries_start = generators_section[record + 3]
+        min_results = self._min_results[entries_start:entries_start + n_entries]
+        if generators_section[record + 4]:
+            index = bisect.bisect_right(min_results, result) - 1
+            return index if index >= 0 else n_entries - 1
+        index = 0
+        for next_index in range(1, n_entries):
+            if min_results[index] <= result < min_results[next_index]:
+                return index
+            index = next_index
+        return index
+
+    def generate(self, generator_name, rng=None, associated=True):
+        '''Generates a result in the format of Generator.generate().'''
+        generators_section = self._generators
+        links = self._links
+        root = []
+        # Tasks are (generator index, dice, associated, parent) for a generator to roll, or
+        # (None, link index, associated, parent) for a link to resolve, as in Resolver.
+        stack = [(self.names[generator_name], -1, associated, root)]
+        while stack:
+            generator, value, associated, parent = stack.pop()
+            if generator is None:
+                kind, target, dice, repeat_dice, repeat, inherit_associated = links[
+                    value * _LINK_FIELDS:(value + 1) * _LINK_FIELDS]
+                if not kind:
+                    parent.append([self._text(target)])
+                    continue
+                if not inherit_associated:
+                    associated = True
+                if repeat_dice >= 0:
+                    repeat = self._roll(repeat_dice, rng)
+                if repeat > 1:
+                    group = []
+                    parent.append(group)
+                    stack.extend([(target, dice, associated, group)] * repeat)
+                else:
+                    stack.append((target, dice, associated, parent))
+                continue
+            record = generator * _GENERATOR_FIELDS
+            node = [self._text(generators_section[record])]
+            parent.append(node)
+            to_resolve = []
+            if generators_section[record + 2]:
+                result = self._roll(generators_section[record + 1] if value < 0 else value, rng)
+                entry = (generators_section[record + 3] + self._entry_index(record, result)) * 2
+                links_start = self._entries[entry]
+                to_resolve.extend(range(links_start, links_start + self._entries[entry + 1]))
+            if associated:
+                associated_start = generators_section[record + 8]
+                to_resolve.extend(range(associated_start,
+                                        associated_start + generators_section[record + 9]))
+            for link in reversed(to_resolve):
+                field = link * _LINK_FIELDS
+                # Links without repeat roll nothing when resolved, they are pushed as generators.
+                if links[field] and links[field + 3] < 0 and links[field + 4] == 1:
+                    stack.append((links[field + 1], links[field + 2],
+                                  associated if links[field + 5] else True, node))
+                else:
+                    stack.append((None, link, associated, node))
+        return root[0]
+
+_DICE_NOTATION = re.compile(r'(?:\d*d\d+|\d+)(?:[+-]\d+|\+\d*d\d+)*')
+_DICE_TERM = re.compile(r'([+-]?)(?:(\d*)d(\d+)|(\d+))')
+
+# Dice by notation, so that equal notations share a single object.
+_dice_notations = {'d%d' % die.value: die for die in (d2, d3, d4, d6, d8, d10, d12, d20, d100)}
+
+def parse_dice(notation):
+    '''Returns the Die or Dice rolled by a notation such as d12, 3d6 or d8+4.'''
+    try:
+        return _dice_notations[notation]
+    except KeyError:
+        pass
+    compact = notation.replace(' ', '')
+    if not _DICE_NOTATION.fullmatch(compact):
+        raise ValueError(notation + ': invalid dice notation')
+    dice_list = []
+    bonus = 0
+    for sign, n, value, number in _DICE_TERM.findall(compact):
+        if number:
+            bonus += -int(number) if sign == '-' else int(number)
+            continue
+        if int(value) == 0 or n and int(n) == 0:
+            raise ValueError(notation + ': invalid dice notation')
+        if n in ('', '1'):
+            # Single dice are shared by notation, as the predefined ones.
+            die_notation = 'd' + str(int(value))
+            if die_notation not in _dice_notations:
+                _dice_notations[die_notation] = Die(int(value))
+            dice_list.append(_dice_notations[die_notation])
+        else:
+            dice_list.append(Die(int(value), int(n)))
+    if len(dice_list) == 1 and not bonus:
+        dice = dice_list[0]
+    else:
+        dice = Dice(dice_list, bonus)
+    _dice_notations[notation] = dice
+    return dice
+
+TABLES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables')
+
+# Table packs of TABLES_DIRECTORY loaded at import, in order.
+TABLE_PACKS = ('discovery.json',
+               'dungeon.json',
+               'dangers.json',
+               'creatures.json',
+               'npc.json',
+               'details.json',
+               'custom.json')
+
+# Bump when the layout returned by _compile_table_pack changes, to invalidate caches.
+TABLE_PACK_CACHE_VERSION = 1
+
+# Time in seconds the whole import of the module should take within, tables included, see
+# import_time.
+IMPORT_TIME_BUDGET = 0.1
+
+def _compile_table_pack(path):
+    '''Reads a json table pack into plain tuples, as stored in the table pack cache.
+
+    Each table is (name, dice, entries, associated_generators), entries being (min_result,
+    outcomes) pairs and GenerateAction outcomes (generator_name, dice, repeat, associated).
+    Raises ValueError when the pack is not valid json or does not have this structure.'''
+    with open(path, encoding='utf-8') as file:
+        tables = json.load(file)
+
+    def invalid(name, what, value):
+        return ValueError('{}: {}: invalid {} {!r}'.format(path, name, what, value))
+
+    def compile_outcome(name, outcome):
+        if isinstance(outcome, str):
+            return outcome
+        if not isinstance(outcome, dict) or not isinstance(outcome.get('generate'), str):
+            raise invalid(name, 'outcome', outcome)
+        compiled_outcome = (outcome['generate'], outcome.get('dice'), outcome.get('repeat', 1),
+                            outcome.get('associated', True))
+        _, dice, repeat, associated = compiled_outcome
+        if (not isinstance(dice, (str, type(None))) or isinstance(repeat, bool)
+                or not isinstance(repeat, (int, str)) or not isinstance(associated, bool)):
+            raise invalid(name, 'outcome', outcome)
+        return compiled_outcome
+
+    def compile_outcomes(name, outcomes):
+        if not isinstance(outcomes, list):
+            raise invalid(name, 'outcomes', outcomes)
+        return tuple(compile_outcome(name, outcome) for outcome in outcomes)
+
+    def compile_entry(name, entry):
+        if (not isinstance(entry, list) or len(entry) != 2 or isinstance(entry[0], bool)
+                or not isinstance(entry[0], int)):
+            raise invalid(name, 'entry', entry)
+        return entry[0], compile_outcomes(name, entry[1])
+
+    if not isinstance(tables, dict):
+        raise ValueError('{}: not an object of tables'.format(path))
+    compiled = []
+    for name, table in tables.items():
+        if not isinstance(table, dict):
+            raise invalid(name, 'table', table)
+        entries = table.get('entries')
+        if entries is not None:
+            if not isinstance(entries, list):
+                raise invalid(name, 'entries', entries)
+            entries = tuple(compile_entry(name, entry) for entry in entries)
+        associated_generators = table.get('associated')
+        if associated_generators is not None:
+            associated_generators = compile_outcomes(name, associated_generators)
+        dice = table.get('dice', 'd12')
+        if not isinstance(dice, str):
+            raise invalid(name, 'dice', dice)
+        compiled.append((name, dice, entries, associated_generators))
+    return tuple(compiled)
+
+def _read_table_pack(path):
+    '''Returns (key, tables): the stat key and the compiled tables of a pack, from its cache
+    when it is up to date.'''
+    stat = os.stat(path)
+    key = (TABLE_PACK_CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    cache_path = os.path.splitext(path)[0] + '.cache'
+    try:
+        with open(cache_path, 'rb') as file:
+            cached_key, tables = marshal.load(file)
+        if cached_key == key:
+            return key, tables
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    tables = _compile_table_pack(path)
+    try:
+        temporary_path = cache_path + '.' + str(os.getpid())
+        with open(temporary_path, 'wb') as file:
+            marshal.dump((key, tables), file)
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        pass
+    return key, tables
+
+def _load_outcome(outcome):
+    if isinstance(outcome, str):
+        return outcome
+    generator_name, dice, repeat, associated = outcome
+    return GenerateAction(generator_name,
+                          parse_dice(dice) if dice is not None else None,
+                          parse_dice(repeat) if isinstance(repeat, str) else repeat,
+                          associated)
+
+def _load_table(table, register=True):
+    name, dice, entries, associated_generators = table
+    if entries is not None:
+        entries = tuple(Entry(min_result, tuple(map(_load_outcome, outcomes)))
+                        for min_result, outcomes in entries)
+    if associated_generators is not None:
+        associated_generators = tuple(map(_load_outcome, associated_generators))
+    return Generator(name, parse_dice(dice), entries, associated_generators, register)
+
+# (key, {name: compiled table}) of each loaded table pack by path, see reload_table_packs.
+_loaded_packs = {}
+
+def load_table_pack(path):
+    '''Registers the generators of a json table pack, returns them.'''
+    key, tables = _read_table_pack(path)
+    _loaded_packs[os.path.abspath(path)] = (key, {table[0]: table for table in tables})
+    return [_load_table(table) for table in tables]
+
+def load_tables():
+    '''Loads the TABLE_PACKS, returns the time it took in seconds.'''
+    start = time.perf_counter()
+    for table_pack in TABLE_PACKS:
+        load_table_pack(os.path.join(TABLES_DIRECTORY, table_pack))
+    link_generators()
+    return time.perf_counter() - start
+
+# Serializes the table pack reloads.
+_reload_lock = threading.Lock()
+
+def reload_table_packs():
+    '''Reloads the tables changed in the loaded table packs since they were read.
+
+    Only the changed tables are compiled again. The generators linking to them, directly or
+    not, are copied and linked again, and the registry is updated at once: generations already
+    running keep using the previous generators. Returns the names of the reloaded and of the
+    removed tables. Raises ValueError, keeping the tables, when a pack is invalid or names a
+    missing generator.'''
+    global _registry_version, _linked_version
+    with _reload_lock:
+        if _linked_version != _registry_version:
+            link_generators()
+        reloaded = {}
+        removed = set()
+        read_packs = {}
+        for path, (key, tables) in _loaded_packs.items():
+            stat = os.stat(path)
+            if (TABLE_PACK_CACHE_VERSION, stat.st_mtime_ns, stat.st_size) == key:
+                continue
+            try:
+                new_key, new_tables = _read_table_pack(path)
+                new_tables = {table[0]: table for table in new_tables}
+                reloaded.update((name, _load_table(table, register=False))
+                                for name, table in new_tables.items()
+                                if tables.get(name) != table)
+            except ValueError as error:
+                # Retried once the pack changes again.
+                _loaded_packs[path] = ((TABLE_PACK_CACHE_VERSION, stat.st_mtime_ns,
+                                        stat.st_size), tables)
+                message = str(error)
+                if not message.startswith(path):
+                    message = '{}: {}'.format(path, message)
+                raise ValueError(message) from error
+            read_packs[path] = (new_key, new_tables)
+            removed.update(name for name in tables if name not in new_tables)
+        removed.difference_update(reloaded)
+        if not read_packs:
+            return [], []
+        import copy
+        registry = {name: generator for name, generator in generators.items()
+                    if name not in removed}
+        registry.update(reloaded)
+        # Generators whose outcomes name a changed table, and so on up to the roots.
+        parents = collections.defaultdict(set)
+        for generator in registry.values():
+            for outcome in _outcomes(generator):
+                name = outcome.generator_name if isinstance(outcome, GenerateAction) else outcome
+                parents[name].add(generator.name)
+        changed = set(reloaded) | removed
+        stack = list(changed)
+        while stack:
+            for parent in parents[stack.pop()]:
+                if parent not in changed:
+                    changed.add(parent)
+                    stack.append(parent)
+                    registry[parent] = copy.copy(registry[parent])
+        dangling = [(name, outcome.generator_name)
+                    for name in changed if name in registry
+                    for outcome in _outcomes(registry[name])
+                    if isinstance(outcome, GenerateAction)
+                    and outcome.generator_name not in registry]
+        if dangling:
+            raise ValueError('missing generators: ' + ', '.join(
+                '{} (in {})'.format(missing, name) for name, missing in dangling))
+        for name in changed:
+            if name in registry:
+                registry[name]._link(registry)
+        for name in removed:
+            del generators[name]
+        generators.update((name, registry[name]) for name in changed if name in registry)
+        _loaded_packs.update(read_packs)
+        _registry_version += 1
+        _linked_version = _registry_version
+        return sorted(reloaded), sorted(removed)
+
+class TablePackWatcher(threading.Thread):
+    '''Daemon thread calling reload_table_packs every interval seconds until stop().
+
+    Invalid packs are reported with a warning. on_reload, when given, is called with the names
+    of the reloaded and of the removed tables after each reload.'''
+
+    def __init__(self, interval=0.1, on_reload=None):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.on_reload = on_reload
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                reloaded, removed = reload_table_packs()
+            except Exception as error:
+                # Any error of an edited pack must not stop the watcher.
+                warnings.warn('table packs not reloaded: {}: {}'.format(type(error).__name__,
+                                                                       error))
+                continue
+            if (reloaded or removed) and self.on_reload is not None:
+                self.on_reload(reloaded, removed)
+
+    def stop(self):
+        self._stopped.set()
+
+def watch_table_packs(interval=0.1, on_reload=None):
+    '''Starts and returns a TablePackWatcher.'''
+    watcher = TablePackWatcher(interval, on_reload)
+    watcher.start()
+    return watcher
+
+# Set to the compiled tables file of the batch workers started by _map_chunks, which generate
+# from it and so do not load the table packs.
+COMPILED_TABLES_ENVIRONMENT = 'PERILOUSGENERATOR_COMPILED_TABLES'
+
+if COMPILED_TABLES_ENVIRONMENT in os.environ:
+    tables_load_time = 0.0
+else:
+    tables_load_time = load_tables()
+
+# Text of the dungeon tables giving the dice of the number of areas, as in 'areas (3d6+6)'.
+_AREAS_TEXT = re.compile(r'areas \((.+)\)')
+
+class DungeonAreas:
+    '''Areas of a dungeon result, generated lazily one area_generator result at a time.
+
+    context is the GenerationContext the dungeon was generated with, the areas are unrelated
+    to the dungeon without it. The number of areas is rolled with the dice of the areas (...)
+    text of the dungeon, in GenerationContext(context.seed, context.spawn_key + ('areas',)),
+    and area i is generated with GenerationContext(context.seed, context.spawn_key + (i,)).
+    Neither depends on how much of context was used, so areas can be iterated, paged or
+    accessed in any order with the same results, and only the areas requested are held in
+    memory.'''
+
+    def __init__(self, dungeon, context=None, area_generator='dungeon exploration'):
+        root, text, children = _result_nodes(dungeon)
+        stack = [root]
+        match = None
+        while stack and match is None:
+            node = stack.pop()
+            match = _AREAS_TEXT.fullmatch(text(node) or '')
+            stack.extend(children(node))
+        if match is None:
+            raise ValueError('no areas in the result')
+        self.dice = parse_dice(match.group(1))
+        self.context = context if context is not None else GenerationContext()
+        self.count = self.dice.roll(GenerationContext(self.context.seed,
+                                                      self.context.spawn_key + ('areas',)))
+        self.generator = generators[area_generator]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError('area index out of range')
+        return self.generator.generate(rng=GenerationContext(
+            self.context.seed, self.context.spawn_key + (index,)))
+
+    def __iter__(self):
+        return map(self.__getitem__, range(self.count))
+
+    def page(self, number, page_size):
+        '''Returns the areas of page number (from 0) of page_size areas.'''
+        return [self[index] for index in range(number * page_size,
+                                               min((number + 1) * page_size, self.count))]
+
+    def pages(self, page_size):
+        '''Yields the areas by pages of page_size areas.'''
+        for number in range((self.count + page_size - 1) // page_size):
+            yield self.page(number, page_size)
+
+# Results per task sent to batch workers. Independent of the number of jobs so that the output
+# does not depend on it.
+BATCH_CHUNK_SIZE = 256
+
+# Chunks generated ahead of the output per worker process. Workers wait for a slow output
+# instead of piling up rendered chunks in memory.
+BATCH_PENDING_CHUNKS = 2
+
+# Modules of the compressed output sinks by file suffix, see open_output.
+COMPRESSED_OUTPUTS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'lzma'}
+
+def open_output(path):
+    '''Opens a text file to write results to, compressed according to its suffix.'''
+    suffix = os.path.splitext(path)[1]
+    if suffix in COMPRESSED_OUTPUTS:
+        return importlib.import_module(COMPRESSED_OUTPUTS[suffix]).open(
+            path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'wt', encoding='utf-8', newline='')
+
+def _generate_chunk(chunk):
+    (generator_name, seed, start, stop, output_format, require, exclude,
+     predicate, transform) = chunk
+    return Renderer(output_format).render_body(
+        _pipeline(generator_name, seed, start, stop, require, exclude, predicate, transform))
+
+def _generate_chunk_results(chunk):
+    return list(_pipeline(*chunk))
+
+# CompiledTables mapped by a batch worker process, see _map_chunks.
+_worker_compiled_tables = None
+
+def _map_compiled_tables(path):
+    global _worker_compiled_tables
+    _worker_compiled_tables = CompiledTables(path)
+
+def _pipeline(generator_name, seed, start, stop, require=(), exclude=(), predicate=None,
+              transform=None):
+    # Result i always uses the stream of GenerationContext(seed).spawn(...)[i].
+    if _worker_compiled_tables is not None:
+        results = (_worker_compiled_tables.generate(generator_name, GenerationContext(seed, (i,)))
+                   for i in range(start, stop))
+    else:
+        generator = generators[generator_name]
+        results = (generator.generate(rng=GenerationContext(seed, (i,)), require=require,
+                                      exclude=exclude)
+                   for i in range(start, stop))
+    if predicate is not None:
+        results = filter(predicate, results)
+    if transform is not None:
+        results = map(transform, results)
+    return results
+
+def _map_chunks(function, chunks, jobs, compiled_tables=None):
+    '''Yields function(chunk) of each chunk in order, computed in jobs worker processes with at
+    most BATCH_PENDING_CHUNKS per worker waiting to be consumed.
+
+    With the compiled tables file compiled_tables, workers are spawned without loading the
+    table packs and generate from the mapped file: their memory and start-up time do not
+    depend on the tables. Forked workers would share the registry of this process anyway.'''
+    if jobs == 1:
+        yield from map(function, chunks)
+        return
+    import multiprocessing
+    if compiled_tables is None:
+        pool = multiprocessing.Pool(jobs)
+    else:
+        os.environ[COMPILED_TABLES_ENVIRONMENT] = compiled_tables
+        try:
+            pool = multiprocessing.get_context('spawn').Pool(jobs, _map_compiled_tables,
+                                                             (compiled_tables,))
+        finally:
+            del os.environ[COMPILED_TABLES_ENVIRONMENT]
+    with pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            if len(pending) == jobs * BATCH_PENDING_CHUNKS:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(function, (chunk,)))
+        while pending:
+            yield pending.popleft().get()
+
+def iter_results(generator_name, count, seed, jobs=1, require=(), exclude=(), predicate=None,
+                 transform=None, compiled_tables=None):
+    '''Yields the results generate_batch writes, lazily and in order.
+
+    predicate filters results and transform maps them, both run in the worker processes and
+    must be picklable when jobs is not 1. Memory does not depend on count. With the path of a
+    compiled tables file, see write_compiled_tables, the workers generate from it, with the
+    same results. It is not used with one job or with require or exclude, which need the
+    generators.'''
+    chunks = ((generator_name, seed, start, min(start + BATCH_CHUNK_SIZE, count), tuple(require),
+               tuple(exclude), predicate, transform)
+              for start in range(0, count, BATCH_CHUNK_SIZE))
+    if require or exclude:
+        compiled_tables = None
+    for results in _map_chunks(_generate_chunk_results, chunks, jobs, compiled_tables):
+        yield from results
+
+def generate_batch(generator_name, count, seed, output_format='tree', jobs=1, output=None,
+                   require=(), exclude=(), predicate=None, transform=None,
+                   compiled_tables=None):
+    '''Generate count results and write them in order to output (stdout by default).
+
+    Results only depend on seed, not on the number of worker processes jobs. They are rendered
+    in the workers and written by chunks, memory does not depend on count. predicate,
+    transform and compiled_tables are used as in iter_results.'''
+    output = output or sys.stdout
+    renderer = Renderer(output_format)
+    chunks = ((generator_name, seed, start, min(start + BATCH_CHUNK_SIZE, count), output_format,
+               tuple(require), tuple(exclude), predicate, transform)
+              for start in range(0, count, BATCH_CHUNK_SIZE))
+    if require or exclude:
+        compiled_tables = None
+    renderer.write_document(_map_chunks(_generate_chunk, chunks, jobs, compiled_tables), output)
+
+def _parse_args(argv):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='DungeonWorld generators based on the Perilous Wilds. '
+                    'Without a generator name, starts an interactive session.')
+    parser.add_argument('generator', nargs='?', help='name of the generator to call')
+    parser.add_argument('-n', '--count', type=int, default=1, help='number of results')
+    parser.add_argument('--seed', type=int, help='seed of the results (random by default)')
+    parser.add_argument('--format', choices=Renderer.FORMATS, default='tree',
+                        help='output format, ndjson writes one json result per line')
+    parser.add_argument('-o', '--output', metavar='PATH',
+                        help='file to write the results to (stdout by default), compressed '
+                             'when it ends with ' + ', '.join(COMPRESSED_OUTPUTS))
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes, 0 for one per core')
+    parser.add_argument('--areas', action='store_true',
+                        help='follow each dungeon with its areas, generated and written one by '
+                             'one in the same document')
+    parser.add_argument('--shared-tables', action='store_true',
+                        help='workers generate from a single memory mapped copy of the '
+                             'compiled tables')
+    parser.add_argument('--require', action='append', default=[], metavar='TEXT',
+                        help='only generate results containing this text or generator, '
+                             'can be repeated')
+    parser.add_argument('--exclude', action='append', default=[], metavar='TEXT',
+                        help='only generate results without this text or generator, '
+                             'can be repeated')
+    parser.add_argument('--analyze', choices=Analytics.KINDS,
+                        help='sample count results and print the frequencies of generators, '
+                             'leaves or paths instead of the results')
+    parser.add_argument('--expect', action='store_true',
+                        help='print the exact expected size and depth of the results and the '
+                             'probability of each leaf instead of the results')
+    parser.add_argument('--check', action='store_true',
+                        help='check the generators graph and exit')
+    args = parser.parse_args(argv)
+    if args.generator is not None and args.generator not in generators:
+        parser.error(args.generator + ': not found')
+    if args.count < 0:
+        parser.error('count must be positive')
+    if args.jobs < 0:
+        parser.error('jobs must be positive')
+    if args.areas and (args.jobs != 1 or args.shared_tables):
+        parser.error('areas are generated in a single process, without --jobs or '
+                     '--shared-tables')
+    return args
+
+def _interactive():
+    watch_table_packs()
     try:
         previous_generator_name = 'discovery'
+        previous_result = None
         while True:
             generator_name = input('Enter a generator name (default: '
                                    + previous_generator_name
                                    + '): ')
             if generator_name == 'ls':
                 print(', '.join(generators.keys()))
+            elif generator_name == 'stats on':
+                enable_instrumentation()
+            elif generator_name == 'stats off':
+                disable_instrumentation()
+            elif generator_name == 'stats':
+                if instrumentation is None:
+                    print('stats are disabled, enter stats on to record them')
+                else:
+                    print(instrumentation.format())
+            elif generator_name.startswith('reroll '):
+                if previous_result is None:
+                    print('nothing to reroll yet')
+                    continue
+                try:
+                    previous_result = reroll(previous_result, generator_name[len('reroll '):])
+                except ValueError as error:
+                    print(error)
+                else:
+                    sys.stdout.write(render_tree(previous_result))
             elif generator_name == '':
-                generators[previous_generator_name].generate_print()
+                previous_result = generators[previous_generator_name].generate_print()
             elif generator_name in generators:
-                generators[generator_name].generate_print()
+                previous_result = generators[generator_name].generate_print()
                 previous_generator_name = generator_name
             else:
                 print(generator_name + ': not found')
     except KeyboardInterrupt:
         print('Quitting')
 
+def _print_check():
+    report = check_generators()
+    for name, missing in report.dangling:
+        print('dangling: ' + missing + ' (in ' + name + ')')
+    for name, text, close_name in report.misspelled:
+        print('misspelled: ' + text + ' (in ' + name + '), did you mean ' + close_name + ' ?')
+    for name in report.unreachable:
+        print('unreachable: ' + name)
+    for cycle in report.cycles:
+        print('cycle: ' + ' -> '.join(cycle + cycle[:1]))
+    return 1 if report.dangling else 0
+
+def _print_analytics(generator_name, count, seed, kind):
+    analytics = Analytics(generator_name)
+    analytics.sample(count, seed)
+    for frequency in analytics.frequencies(kind):
+        key = frequency.key if isinstance(frequency.key, str) else '/'.join(frequency.key)
+        print('{:>8.4f} [{:.4f}, {:.4f}] {:>10} {}'.format(
+            frequency.frequency, frequency.low, frequency.high, frequency.count, key))
+    for name, entry in analytics.unreached_entries():
+        print('unreached: {} entry {} {}'.format(name, entry.min_result, entry.outcomes))
+
+def _print_areas(generator_name, count, seed, output_format, output, require=(), exclude=()):
+    renderer = Renderer(output_format)
+    renderer.write_document(map(renderer.render_body,
+                                _dungeons_areas(generator_name, count, seed, require, exclude)),
+                            output)
+
+def _dungeons_areas(generator_name, count, seed, require=(), exclude=()):
+    '''Yields (dungeon,) and then (area,) of each area, for count dungeons as generate_batch.'''
+    for i in range(count):
+        context = GenerationContext(seed, (i,))
+        dungeon = generators[generator_name].generate(rng=context, require=require,
+                                                      exclude=exclude)
+        yield (dungeon,)
+        try:
+            areas = DungeonAreas(dungeon, context)
+        except ValueError:
+            continue
+        for area in areas:
+            yield (area,)
+
+def _print_expectations(generator_name):
+    model = ExpectationModel()
+    print('expected nodes: {:.4f}'.format(model.expected_nodes(generator_name)))
+    print('expected depth: {:.4f}'.format(model.expected_depth(generator_name)))
+    for (name, text), probability in sorted(model.reach_probabilities(generator_name).items(),
+                                            key=lambda item: item[1], reverse=True):
+        print('{:>8.4f} {}/{}'.format(probability, name, text))
+
+def main(argv=None):
+    import contextlib
+    import tempfile
+    args = _parse_args(argv)
+    if args.check:
+        sys.exit(_print_check())
+    elif args.generator is None:
+        _interactive()
+    elif args.expect:
+        _print_expectations(args.generator)
+    elif args.analyze:
+        try:
+            _print_analytics(args.generator, args.count, args.seed, args.analyze)
+        except ImportError as error:
+            sys.exit(error)
+    else:
+        seed = args.seed if args.seed is not None else GenerationContext().seed
+        if args.require or args.exclude:
+            try:
+                expectation_model.sample(args.generator, args.require, args.exclude)
+            except ValueError as error:
+                sys.exit(error)
+        with contextlib.ExitStack() as stack:
+            output = sys.stdout
+            if args.output is not None:
+                output = stack.enter_context(open_output(args.output))
+            jobs = args.jobs or os.cpu_count()
+            compiled_tables = None
+            # Only batch workers generating without constraints use the compiled tables.
+            if args.shared_tables and jobs != 1 and not args.require and not args.exclude:
+                directory = stack.enter_context(tempfile.TemporaryDirectory())
+                compiled_tables = os.path.join(directory, 'tables.pgct')
+                write_compiled_tables(compiled_tables)
+            if args.areas:
+                _print_areas(args.generator, args.count, seed, args.format, output,
+                             args.require, args.exclude)
+            else:
+                generate_batch(args.generator, args.count, seed, args.format, jobs, output,
+                               args.require, args.exclude, compiled_tables=compiled_tables)
+
+# Time in seconds the import of the module took, of which tables_load_time loading the tables.
+import_time = time.perf_counter() - _import_start
+if import_time > IMPORT_TIME_BUDGET:
+    warnings.warn('importing took {:.3f}s, over the {}s budget'
+                  .format(import_time, IMPORT_TIME_BUDGET))
+
 if __name__ == '__main__':
     main()
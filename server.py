@@ -0,0 +1,238 @@
+'''Local asyncio HTTP server generating results of perilousgenerator.
+
+GET /generate?name=danger&count=3&seed=42&format=json generates count results of a generator
+in a Renderer format. Seeded requests are generated on demand in the worker processes, with
+the same output as `perilousgenerator.py name --count count --seed seed`. Unseeded requests
+are served from per generator and format pools of rendered results, refilled in the
+background.
+GET /generators lists the generators. Edits of the table packs are picked up while serving.'''
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import io
+import json
+import multiprocessing
+import os
+import urllib.parse
+
+import perilousgenerator
+
+# Largest count of results of a single request.
+MAX_COUNT = 10000
+
+CONTENT_TYPES = {'tree': 'text/plain; charset=utf-8',
+                 'json': 'application/json',
+                 'ndjson': 'application/x-ndjson',
+                 'markdown': 'text/markdown; charset=utf-8',
+                 'csv': 'text/csv; charset=utf-8'}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _generate_results(generator_name, seed, count):
+    '''Generates results in a worker process, result i using GenerationContext(seed, (i,)).'''
+    generator = perilousgenerator.generators[generator_name]
+    return [generator.generate(rng=perilousgenerator.GenerationContext(seed, (i,)))
+            for i in range(count)]
+
+def _render_seeded(generator_name, seed, count, output_format):
+    renderer = perilousgenerator.Renderer(output_format)
+    return renderer.render_many(_generate_results(generator_name, seed, count))
+
+def _render_bodies(generator_name, seed, count, output_format):
+    '''Generates results in a worker process and returns the Renderer.render_body of each.'''
+    renderer = perilousgenerator.Renderer(output_format)
+    return [renderer.render_body((result,))
+            for result in _generate_results(generator_name, seed, count)]
+
+class ResultPool:
+    '''Rendered results of a generator in a format, refilled in the background below low_water
+    results.'''
+
+    def __init__(self, server, generator_name, output_format, size):
+        self.server = server
+        self.generator_name = generator_name
+        self.output_format = output_format
+        self.size = size
+        self.low_water = max(1, size // 2)
+        self.results = collections.deque()
+        self._refill_task = None
+
+    def take(self, count):
+        '''Returns up to count rendered results and starts a refill if needed.'''
+        taken = [self.results.popleft() for _ in range(min(count, len(self.results)))]
+        self.refill()
+        return taken
+
+    def refill(self):
+        if len(self.results) < self.low_water and self._refill_task is None:
+            self._refill_task = asyncio.ensure_future(self._refill())
+
+    async def _refill(self):
+        try:
+            while len(self.results) < self.size:
+                seed = perilousgenerator.GenerationContext().seed
+                results = await self.server.run_in_worker(
+                    _render_bodies, self.generator_name, seed, self.size - len(self.results),
+                    self.output_format)
+                self.results.extend(results)
+        finally:
+            self._refill_task = None
+
+class GenerationServer:
+    '''Serves generations over HTTP on a TCP or a Unix socket.
+
+    Generation runs in a pool of jobs worker processes. prewarmed generators get a pool of
+    pool_size rendered results in each format at start, other generators and formats on their
+    first request.'''
+
+    def __init__(self, jobs=None, pool_size=64, prewarmed=perilousgenerator.ROOT_GENERATORS):
+        # Workers reload the edited table packs on their own. They are started lazily, once the
+        # table pack watcher thread of the server runs, so they come from a fork server: a fork
+        # of the server could copy the reload lock while held.
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            jobs, mp_context=multiprocessing.get_context('forkserver'),
+            initializer=perilousgenerator.watch_table_packs)
+        self.pool_size = pool_size
+        self.pools = {}
+        self.prewarmed = prewarmed
+
+    def run_in_worker(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def pool(self, generator_name, output_format):
+        key = (generator_name, output_format)
+        if key not in self.pools:
+            self.pools[key] = ResultPool(self, generator_name, output_format, self.pool_size)
+        return self.pools[key]
+
+    async def generate(self, generator_name, count, seed, output_format):
+        '''Returns count rendered results, seeded results are always generated on demand.'''
+        if seed is not None:
+            return await self.run_in_worker(_render_seeded, generator_name, seed, count,
+                                            output_format)
+        bodies = self.pool(generator_name, output_format).take(count)
+        if len(bodies) < count:
+            bodies.extend(await self.run_in_worker(
+                _render_bodies, generator_name, perilousgenerator.GenerationContext().seed,
+                count - len(bodies), output_format))
+        # Only joins the rendered results on the event loop.
+        output = io.StringIO()
+        perilousgenerator.Renderer(output_format).write_document(bodies, output)
+        return output.getvalue()
+
+    async def handle_request(self, path):
+        '''Returns (content type, body) of a GET request path.'''
+        url = urllib.parse.urlsplit(path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path == '/generators':
+            return 'application/json', json.dumps(list(perilousgenerator.generators)) + '\n'
+        elif url.path != '/generate':
+            raise HTTPError(404, url.path + ': not found')
+        generator_name = query.get('name', '')
+        if generator_name not in perilousgenerator.generators:
+            raise HTTPError(404, generator_name + ': not found')
+        output_format = query.get('format', 'tree')
+        if output_format not in perilousgenerator.Renderer.FORMATS:
+            raise HTTPError(400, output_format + ': unknown format')
+        try:
+            count = int(query.get('count', 1))
+            seed = int(query['seed']) if 'seed' in query else None
+        except ValueError:
+            raise HTTPError(400, 'count and seed must be integers')
+        if not 0 <= count <= MAX_COUNT:
+            raise HTTPError(400, 'count must be between 0 and {}'.format(MAX_COUNT))
+        body = await self.generate(generator_name, count, seed, output_format)
+        return CONTENT_TYPES[output_format], body
+
+    async def _handle_request_line(self, request_line):
+        try:
+            method, path, _ = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, 'bad request')
+        if method != 'GET':
+            raise HTTPError(405, method + ': method not allowed')
+        return await self.handle_request(path)
+
+    async def handle_connection(self, reader, writer):
+        '''Serves HTTP/1.1 GET requests of a connection, kept alive until closed.'''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip().lower()
+                status = 200
+                content_type = 'text/plain; charset=utf-8'
+                try:
+                    content_type, body = await self._handle_request_line(request_line)
+                except HTTPError as error:
+                    status = error.status
+                    body = str(error) + '\n'
+                except Exception as error:
+                    # Such as a broken worker pool, the client still gets a response.
+                    status = 500
+                    body = 'internal error: {}\n'.format(type(error).__name__)
+                body = body.encode('utf-8')
+                keep_alive = headers.get('connection') != 'close'
+                writer.write('HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n'
+                             'Connection: {}\r\n\r\n'.format(
+                                 status, 'OK' if status == 200 else 'Error', content_type,
+                                 len(body), 'keep-alive' if keep_alive else 'close')
+                             .encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _on_reload(self, reloaded, removed):
+        # Pooled results may come from the previous tables.
+        self.pools.clear()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_path=None):
+        loop = asyncio.get_running_loop()
+        perilousgenerator.watch_table_packs(
+            on_reload=lambda *tables: loop.call_soon_threadsafe(self._on_reload, *tables))
+        for generator_name in self.prewarmed:
+            for output_format in perilousgenerator.Renderer.FORMATS:
+                self.pool(generator_name, output_format).refill()
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serves perilousgenerator results over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='number of worker processes, 0 for one per core')
+    parser.add_argument('--pool-size', type=int, default=64,
+                        help='rendered results kept per generator and format')
+    args = parser.parse_args(argv)
+    server = GenerationServer(args.jobs or os.cpu_count(), args.pool_size)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        print('Quitting')
+    finally:
+        server.executor.shutdown(cancel_futures=True)
+
+if __name__ == '__main__':
+    main()